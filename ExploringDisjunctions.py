@@ -1,8 +1,4 @@
 #!/usr/bin/env python3
-from six.moves import xrange
-from ortools.constraint_solver import pywrapcp
-from ortools.constraint_solver import routing_enums_pb2
-from functools import partial
 import argparse
 
 
@@ -49,36 +45,6 @@ def create_data_model(args):
     return data
 
 
-def print_solution(data, manager, routing, assignment):
-    """Prints assignment on console."""
-    total_distance = 0
-    total_load = 0
-    for vehicle_id in range(0,len(data['vehicle_costs'])):
-        index = routing.Start(vehicle_id)
-        plan_output = 'Route for vehicle {}:\n'.format(vehicle_id)
-        route_distance = 0
-        route_load = 0
-        arc_cost = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_load += data['demands'][node_index]
-            plan_output += ' {0} Load({1}) Cost({2}) -> '.format(node_index, route_load, arc_cost)
-            previous_index = index
-            index = assignment.Value(routing.NextVar(index))
-            arc_cost = routing.GetArcCostForVehicle(
-                previous_index, index, vehicle_id)
-            route_distance += arc_cost
-        plan_output += ' {0} Load({1}) Cost({2})\n'.format(
-            manager.IndexToNode(index), route_load, arc_cost)
-        plan_output += 'Distance of the route: {}m\n'.format(route_distance)
-        plan_output += 'Load of the route: {}\n'.format(route_load)
-        print(plan_output)
-        total_distance += route_distance
-        total_load += route_load
-    print('Total distance of all routes: {}m'.format(total_distance))
-    print('Total load of all routes: {}'.format(total_load))
-
-
 def main():
     parser = argparse.ArgumentParser(description='Play around with various options relating to disjunctions')
     parser.add_argument('-c,--cardinality_disjunction', type=bool, dest='multi_disjunctions',
@@ -104,175 +70,55 @@ def main():
                         help='whether or not to use 7 demand nodes in problem.  Defaults to false, which will use 5 nodes')
     args = parser.parse_args()
 
+    # imported after parsing, so --help does not wait for ortools
+    from ortools.constraint_solver import routing_enums_pb2
+    from disjunctions import build_routing_model
+    from disjunctions import cardinality_penalty
+    from disjunctions import search_parameters
+    from disjunctions import print_solution
+
 
     """Solve the CVRP problem."""
     # Instantiate the data problem.
     data = create_data_model(args)
-    num_nodes = len(data['demands'])
-    # Create the routing index manager.
-    manager = pywrapcp.RoutingIndexManager(
-        num_nodes, len(data['vehicle_costs']), data['depot'])
-
-    # Create Routing Model.
-    routing = pywrapcp.RoutingModel(manager)
-    solver = routing.solver()
-
-    # Create and register a transit callback.
-    def distance_callback(manager, from_index, to_index):
-        """Returns the distance between the two nodes."""
-        # Convert from routing variable Index to distance matrix NodeIndex.
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data['distance_matrix'][from_node][to_node]
-
-    def vehicle_distance_callback(vehicle, manager, from_index, to_index):
-        """Returns the distance between the two nodes for a vehicle."""
-        # Convert from routing variable Index to distance matrix NodeIndex.
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        # print(vehicle,data['vehicle_costs'][vehicle])
-        return data['distance_matrix'][from_node][to_node]*data['vehicle_costs'][vehicle]
-
-    transit_callback_index = routing.RegisterTransitCallback(partial(distance_callback,
-                                                                     manager))
-
-    # use per-vehicle arc cost evaluators
-
-    vehicle_transits = [
-        routing.RegisterTransitCallback(
-            partial(vehicle_distance_callback,v,manager)
-        ) for v in range(0,len(data['vehicle_costs']))]
-
-    vehicle_costs = [routing.SetArcCostEvaluatorOfVehicle(t,v) for (t,v) in zip(vehicle_transits,
-                                                                range(0,len(data['vehicle_costs'])))]
-
-    # create travel cost dimension
-    routing.AddDimensionWithVehicleTransits(
-        vehicle_transits,
-        0,      # no slack
-        300000, # some really large time
-        True,
-        "Time")
-
-    # Add Capacity constraint.
-    def demand_callback(manager,from_index):
-        """Returns the demand of the node."""
-        # Convert from routing variable Index to demands NodeIndex.
-        from_node = manager.IndexToNode(from_index)
-        if from_node < len( data['demands'] ):
-            return data['demands'][from_node]
-        return 0
-
-    demand_callback_index = routing.RegisterUnaryTransitCallback(
-        partial(demand_callback,manager))
-    routing.AddDimensionWithVehicleCapacity(
-        demand_callback_index,
-        0,  # null capacity slack
-        data['vehicle_capacities'],  # vehicle maximum capacities
-        True,  # start cumul to zero
-        'Capacity')
-
-
-    # count
-    count_dimension_name = 'count'
-    routing.AddConstantDimension(
-        1, # increment by one every time
-        num_nodes,  # max count is visit all the nodes
-        True,  # set count to zero
-        count_dimension_name)
-    count_dimension = routing.GetDimensionOrDie(count_dimension_name)
-
-    indexA1 = routing.End(0);
-    indexA2 = routing.End(1);
-    indexA3 = routing.End(2);
-    indexA4 = routing.End(3);
-    end_count_A1 = count_dimension.CumulVar(indexA1);
-    active_end_A1 = routing.VehicleVar(indexA1) == 0
-
-    end_count_A2 = count_dimension.CumulVar(indexA2);
-    active_end_A2 = routing.VehicleVar(indexA2) == 1
-
-    end_count_A3 = count_dimension.CumulVar(indexA3);
-    active_end_A3 = routing.VehicleVar(indexA3) == 2
-
-    end_count_A4 = count_dimension.CumulVar(indexA4);
-    active_end_A4 = routing.VehicleVar(indexA4) == 3
-
-
-    A1_on = end_count_A1 > 1;
-    A2_on = end_count_A2 > 1;
-    A3_on = end_count_A3 > 1;
-    A4_on = end_count_A4 > 1;
-
-    conditional_1_2 = solver.ConditionalExpression(
-        A1_on,
-        end_count_A2 == 1,
-        1)
-    conditional_2_1 = solver.ConditionalExpression(
-        A2_on,
-        end_count_A1 == 1,
-        1)
-    # solver.Add(conditional_1_2>=1)
-    # solver.Add(conditional_2_1>=1)
-    # solver.Add(A1_on * A2_on == 0);
-    solver.Add(A1_on + A2_on <= 1);
-
-    conditional_3_4 = solver.ConditionalExpression(
-        A3_on,
-        end_count_A4 == 1,
-        1)
-    conditional_4_3 = solver.ConditionalExpression(
-        A4_on,
-        end_count_A3 == 1,
-        1)
-    # solver.Add(conditional_3_4>=1)
-    # solver.Add(conditional_4_3>=1)
-    # solver.Add(A3_on * A4_on == 0);
-    solver.Add(A3_on + A4_on <= 1);
+    manager, routing = build_routing_model(
+        data,
+        count_constraint=True,
+        cardinality_disjunction=args.multi_disjunctions,
+        cardinality=args.cardinality,
+        cardinality_penalty=args.penalty)
 
     # disjunctions on nodes
     # truck cost < Penalty < truck with trailer cost
     if args.multi_disjunctions:
-        # penalty = 6+data['vehicle_costs'][0] + 2
-        penalty = 10 * data['vehicle_costs'][0] + 1
-        if args.penalty>0:
-            penalty=args.penalty
-        print('max cardinality disjunction penalty is',penalty)
-
-        pickup_nodes = [manager.NodeToIndex(i)
-                            for i in range(1,len(data['demands']))]
-        routing.AddDisjunction(pickup_nodes,penalty,args.cardinality)
+        print('max cardinality disjunction penalty is',
+              cardinality_penalty(data, args.penalty))
         print('added one max cardinality disjunction across all nodes')
 
     if args.single_disjunctions:
         print('single node disjunction penalty is',args.singlepenalty)
         disjunctions = [routing.AddDisjunction([i],args.singlepenalty)
-                        for i in range(1,num_nodes)]
+                        for i in range(1,len(data['demands']))]
         print('added',len(disjunctions),'disjunctions, one per node',disjunctions)
-    # Setting first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.local_search_operators.use_path_lns = pywrapcp.BOOL_TRUE
-    search_parameters.local_search_operators.use_inactive_lns = pywrapcp.BOOL_TRUE
-    search_parameters.lns_time_limit.seconds = 10000  # 10000 milliseconds
-    search_parameters.first_solution_strategy = (
+
+    # Setting parameters and first solution heuristic.
+    parameters = search_parameters(log_search=args.log_search)
+    parameters.first_solution_strategy = (
     #    routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION)
         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
     #    routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
 
-    if args.log_search:
-        search_parameters.log_search = pywrapcp.BOOL_TRUE
-
     # Solve the problem.
-    assignment = routing.SolveWithParameters(search_parameters)
+    assignment = routing.SolveWithParameters(parameters)
 
     # Print solution on console.
     if assignment:
         print('The Objective Value is {0}'.format(assignment.ObjectiveValue()))
         # examine the xor constraint stuff
-        print('A1 end count',assignment.Value(end_count_A1))
-        print('A2 end count',assignment.Value(end_count_A2))
-        print('A3 end count',assignment.Value(end_count_A3))
-        print('A4 end count',assignment.Value(end_count_A4))
+        count_dimension = routing.GetDimensionOrDie('count')
+        for v in range(0, len(data['vehicle_costs'])):
+            print('A{} end count'.format(v + 1),
+                  assignment.Value(count_dimension.CumulVar(routing.End(v))))
 
         print_solution(data, manager, routing, assignment)
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark routing model construction against node and vehicle count.
+
+Each synthetic instance is built with disjunctions.build_routing_model,
+once with Python transit callbacks and once with solver-side transit
+matrices, and closed with the default search parameters, as the first
+solve would close it; the best of a few builds is reported.  Nothing
+is solved, so the times are the construction cost every solve path pays
+up front.
+"""
+import argparse
+import time
+
+from disjunctions import build_routing_model
+from disjunctions import search_parameters
+from disjunctions import synthetic_data_model
+
+
+def time_build(num_nodes, vehicles, matrix_transits, options, repeat):
+    """Returns the fastest of repeat builds and closes of one synthetic instance, in seconds."""
+    best = None
+    for _ in range(repeat):
+        data = synthetic_data_model(num_nodes, vehicles)
+        start = time.perf_counter()
+        manager, routing = build_routing_model(
+            data, matrix_transits=matrix_transits, **options)
+        routing.CloseModelWithParameters(search_parameters())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(num_nodes, vehicles, options, repeat):
+    row = [num_nodes, vehicles]
+    for matrix_transits in (False, True):
+        row.append(1000 * time_build(num_nodes, vehicles, matrix_transits,
+                                     options, repeat))
+    print('{0:>6} {1:>9} {2:>14.1f} {3:>14.1f}'.format(*row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time routing model construction for growing node and vehicle counts')
+    parser.add_argument('--nodes', type=str, dest='nodes', default='10,100,500,1000',
+                        help='comma separated node counts; default 10,100,500,1000')
+    parser.add_argument('--vehicles', type=str, dest='vehicles', default='1,10,50',
+                        help='comma separated numbers of vehicle pairs; default 1,10,50')
+    parser.add_argument('--repeat', type=int, dest='repeat', default=3,
+                        help='builds per instance, best one reported; default 3')
+    parser.add_argument('--fake_nodes', action='store_true', dest='fake_nodes',
+                        default=False,
+                        help='whether or not to build with the vehicle-specific fake nodes and their constraints')
+    args = parser.parse_args()
+
+    options = {'cumulative_constraint': True,
+               'single_disjunctions': True,
+               'fake_nodes': args.fake_nodes,
+               'fake_nodes_constraints': args.fake_nodes}
+    print('{0:>6} {1:>9} {2:>14} {3:>14}'.format(
+        'nodes', 'vehicles', 'callback ms', 'matrix ms'))
+    for num_nodes in [int(n) for n in args.nodes.split(',')]:
+        for vehicles in [int(v) for v in args.vehicles.split(',')]:
+            bench(num_nodes, vehicles, options, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
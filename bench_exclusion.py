@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Benchmark the encodings that keep both vehicles of a pair from being used.
+
+Every encoding solves the same synthetic instance with the same search
+for a fixed time.  The fake nodes encoding changes the depot costs, so
+every solution is scored on the original matrix: arc costs between
+demand nodes and the depot plus the penalty of each dropped node.  The
+best score any encoding reaches stands in for the optimum, and each
+encoding is reported with the time it took to reach that objective (or
+'-' when it never did), its own best objective and the time of its first
+solution.
+"""
+from functools import partial
+import argparse
+import time
+
+from disjunctions import add_solution_hooks
+from disjunctions import build_routing_model
+from disjunctions import encodings
+from disjunctions import record_improvement
+from disjunctions import search_parameters
+from disjunctions import synthetic_data_model
+
+
+# the max cardinality disjunction drops nodes under a penalty of its
+# own, so its scores do not compare with the single node disjunctions
+pair_encodings = [name for name in encodings if name != 'cardinality']
+
+
+def solve_trace(pairs, nodes_per_pair, options, args):
+    """Solves one encoding; returns its list of (seconds, score) improvements."""
+    data = synthetic_data_model(pairs * nodes_per_pair + 1, pairs, args.seed)
+    original = dict(data)
+    manager, routing = build_routing_model(
+        data, matrix_transits=True, singlepenalty=args.penalty, **options)
+    parameters = search_parameters(args.timelimit, args.first_solution,
+                                   args.metaheuristic)
+    trace = []
+    start = time.monotonic()
+    add_solution_hooks(routing).append(
+        partial(record_improvement, original, manager, routing, args.penalty,
+                trace, start))
+    routing.SolveWithParameters(parameters)
+    return trace
+
+
+def bench(pairs, args):
+    traces = [(name, solve_trace(pairs, args.nodes_per_pair, encodings[name], args))
+              for name in pair_encodings]
+    best = min(trace[-1][1] for (_, trace) in traces if trace)
+    for name, trace in traces:
+        if not trace:
+            print('{0:>6} {1:<13} {2:>10} {3:>10} {4:>10}'.format(
+                pairs, name, '-', '-', '-'))
+            continue
+        reached = [seconds for (seconds, objective) in trace if objective <= best]
+        print('{0:>6} {1:<13} {2:>10} {3:>10.3f} {4:>10}'.format(
+            pairs, name, trace[-1][1], trace[0][0],
+            '{:.3f}'.format(reached[0]) if reached else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare time to best score of the pair exclusion encodings')
+    parser.add_argument('--pairs', type=str, dest='pairs', default='2,5,10,25,50',
+                        help='comma separated numbers of vehicle pairs; default 2,5,10,25,50')
+    parser.add_argument('--nodes_per_pair', type=int, dest='nodes_per_pair', default=5,
+                        help='demand nodes generated per vehicle pair; default 5')
+    parser.add_argument('--penalty', type=int, dest='penalty', default=100000,
+                        help='penalty for dropping a node; default 100000')
+    parser.add_argument('-t,--timelimit', type=int, dest='timelimit', default=10,
+                        help='search time per encoding, in seconds; default 10')
+    parser.add_argument('--first_solution', type=str, dest='first_solution',
+                        default='GLOBAL_CHEAPEST_ARC',
+                        help='first solution strategy; default GLOBAL_CHEAPEST_ARC')
+    parser.add_argument('--metaheuristic', type=str, dest='metaheuristic',
+                        default='GUIDED_LOCAL_SEARCH',
+                        help='local search metaheuristic; default GUIDED_LOCAL_SEARCH')
+    parser.add_argument('--seed', type=int, dest='seed', default=0,
+                        help='seed of the synthetic instances; default 0')
+    args = parser.parse_args()
+
+    print('{0:>6} {1:<13} {2:>10} {3:>10} {4:>10}'.format(
+        'pairs', 'encoding', 'score', 'first s', 'to best s'))
+    for pairs in [int(p) for p in args.pairs.split(',')]:
+        bench(pairs, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Fleet-size scaling benchmark for the disjunction models.
+
+Synthetic instances are generated with fixed seeds along three axes:
+node count, number of vehicle pairs and the fraction of demand nodes
+that may be dropped (each such node gets a single node disjunction; the
+rest must be visited).  Every instance is solved with every pair
+exclusion encoding in disjunctions.encodings and every selected
+metaheuristic, each run in a fresh process so its peak RSS is its own.
+Each node count is generated once and memory-mapped by its runs.  The
+models are built with matrix-backed transits, or from --table_nodes
+with Python callbacks reading the mapped matrix as a flat table, and
+closed before the clock of the solve starts, so model build time and
+solve time are measured apart.  The time limit grows with the square
+of the node count past --scale_nodes, as the time to a first solution
+does.  Wall time, build and solve time, time to first solution, final
+objective and peak RSS go to a JSON baseline file.  With --compare the
+runs are checked against an earlier baseline and regressions are
+listed, exiting with status 1.
+
+    ./bench_scaling.py --nodes 10,100,1000 --pairs 1,10 --output baseline.json
+    ./bench_scaling.py --nodes 10,100,1000 --pairs 1,10 --output new.json --compare baseline.json
+"""
+from contextlib import ExitStack
+from functools import partial
+from itertools import product
+import argparse
+import json
+import math
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+
+from disjunctions import add_solution_hooks
+from disjunctions import build_routing_model
+from disjunctions import encodings
+from disjunctions import load_instance
+from disjunctions import search_parameters
+from disjunctions import shared_instance_files
+from disjunctions import synthetic_data_model
+import disjunction_fail
+
+
+# the max cardinality disjunction decides droppability itself, so it is
+# left out of a benchmark that sweeps the droppable fraction
+bench_encodings = [name for name in encodings if name != 'cardinality']
+
+# the fields naming a run; the others are its measurements
+run_fields = ['nodes', 'pairs', 'droppable', 'encoding', 'metaheuristic']
+measured_fields = ['wall_time', 'build_time', 'solve_time', 'first_solution_time',
+                   'objective', 'peak_rss_kb']
+
+
+def record_first(trace, start):
+    """At-solution hook keeping the time of the first solution."""
+    if not trace:
+        trace.append(time.monotonic() - start)
+
+
+def scaled_timelimit(args, nodes):
+    """Time limit of a run on nodes nodes, at least args.timelimit.
+
+    Past args.scale_nodes it grows with the square of the node count,
+    so larger instances still have the time to find a first solution.
+    """
+    scale = max(1.0, nodes / args.scale_nodes) ** 2
+    return int(math.ceil(args.timelimit * scale))
+
+
+def instance_data(files, pairs, capacity_slack):
+    """Maps the instance in files and sizes a fleet of pairs for it.
+
+    Each combo holds its share of the total demand plus capacity_slack
+    of it, and each single a third of a combo, with the costs of
+    synthetic_data_model.
+    """
+    matrix, demands = load_instance(*files)
+    combo_capacity = int(math.ceil(
+        int(demands.sum()) * (1 + capacity_slack) / pairs))
+    single_capacity = max(1, combo_capacity // 3)
+    return {'distance_matrix': matrix,
+            'demands': demands,
+            'vehicle_capacities': [combo_capacity, single_capacity] * pairs,
+            'vehicle_costs': [5, 1] * pairs,
+            'depot': 0}
+
+
+def run_one(job):
+    """Builds and solves one benchmark run; returns its record."""
+    run, args, files = job
+    start = time.monotonic()
+    data = instance_data(files, run['pairs'], args.capacity_slack)
+    options = dict(encodings[run['encoding']],
+                   single_disjunctions=False)
+    # matrix transits copy the matrix into Python lists, some 7 GB at
+    # 10000 nodes; the table callbacks read the mapped file in place
+    table = run['nodes'] >= args.table_nodes
+    manager, routing = build_routing_model(
+        data, matrix_transits=not table, table_transits=table, **options)
+    rng = np.random.default_rng(args.seed)
+    demand_nodes = np.arange(1, len(data['demands']))
+    droppable = rng.choice(demand_nodes,
+                           int(round(run['droppable'] * len(demand_nodes))),
+                           replace=False)
+    for node in np.sort(droppable):
+        routing.AddDisjunction([manager.NodeToIndex(int(node))], args.penalty)
+    timelimit = scaled_timelimit(args, run['nodes'])
+    parameters = search_parameters(timelimit, args.first_solution,
+                                   run['metaheuristic'])
+    routing.CloseModelWithParameters(parameters)
+    first = []
+    solve_start = time.monotonic()
+    add_solution_hooks(routing).append(
+        partial(record_first, first, solve_start))
+    assignment = routing.SolveWithParameters(parameters)
+    end = time.monotonic()
+
+    record = dict(run)
+    record['transits'] = 'table' if table else 'matrix'
+    record['timelimit'] = timelimit
+    record['wall_time'] = round(end - start, 3)
+    record['build_time'] = round(solve_start - start, 3)
+    record['solve_time'] = round(end - solve_start, 3)
+    record['first_solution_time'] = round(first[0], 3) if first else None
+    record['objective'] = assignment.ObjectiveValue() if assignment else None
+    record['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return record
+
+
+def run_key(record):
+    return tuple(record[name] for name in run_fields)
+
+
+def regressions(baseline, records, tolerances):
+    """Lists how records fall behind the runs of baseline they share.
+
+    A measurement regresses when it is more than its relative tolerance
+    above the baseline, or when the baseline found a solution and the
+    new run did not.
+    """
+    found = []
+    old_runs = {run_key(record): record for record in baseline}
+    for record in records:
+        old = old_runs.get(run_key(record))
+        if old is None:
+            continue
+        for field in measured_fields:
+            # baselines from before a field was measured lack it
+            if old.get(field) is None:
+                continue
+            if record[field] is None:
+                found.append((record, field, old[field], None))
+            elif record[field] > old[field] * (1 + tolerances[field]):
+                found.append((record, field, old[field], record[field]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the disjunction models for growing instances and fleets')
+    parser.add_argument('--nodes', type=str, dest='nodes', default='10,100,1000,3000',
+                        help='comma separated node counts, depot included; default 10,100,1000,3000')
+    parser.add_argument('--pairs', type=str, dest='pairs', default='1,10,100',
+                        help='comma separated numbers of vehicle pairs; default 1,10,100')
+    parser.add_argument('--droppable', type=str, dest='droppable', default='0,0.5,1',
+                        help='comma separated fractions of demand nodes that may be dropped; default 0,0.5,1')
+    parser.add_argument('--encodings', type=str, dest='encodings',
+                        default=','.join(bench_encodings),
+                        help='comma separated pair exclusion encodings; default {}'.format(','.join(bench_encodings)))
+    parser.add_argument('--metaheuristics', type=str, dest='metaheuristics',
+                        default='GREEDY_DESCENT,GUIDED_LOCAL_SEARCH',
+                        help='comma separated local search metaheuristics; default GREEDY_DESCENT,GUIDED_LOCAL_SEARCH')
+    parser.add_argument('--first_solution', type=str, dest='first_solution',
+                        default='LOCAL_CHEAPEST_ARC',
+                        choices=disjunction_fail.first_solution_strategies,
+                        help='first solution strategy; default LOCAL_CHEAPEST_ARC')
+    parser.add_argument('--penalty', type=int, dest='penalty', default=100000,
+                        help='penalty for dropping a droppable node; default 100000')
+    parser.add_argument('--capacity_slack', type=float, dest='capacity_slack', default=0.1,
+                        help='room a combo has past its share of the total demand, as a fraction of that share; default 0.1')
+    parser.add_argument('-t,--timelimit', type=int, dest='timelimit', default=10,
+                        help='solver time limit per run, in seconds, up to --scale_nodes nodes; default 10')
+    parser.add_argument('--scale_nodes', type=int, dest='scale_nodes', default=1000,
+                        help='node count past which the time limit grows with the square of the node count; default 1000')
+    parser.add_argument('--table_nodes', type=int, dest='table_nodes', default=1000,
+                        help='node count from which the transits are Python callbacks reading the mapped matrix, not matrix transits copying it; default 1000')
+    parser.add_argument('--seed', type=int, dest='seed', default=0,
+                        help='seed of the synthetic instances; default 0')
+    parser.add_argument('--workers', type=int, dest='workers', default=1,
+                        help='runs solved at once; more than one skews the timings; default 1')
+    parser.add_argument('--output', type=str, dest='output', default='scaling_baseline.json',
+                        help='JSON file to write the run records to; default scaling_baseline.json')
+    parser.add_argument('--compare', type=str, dest='compare', default=None,
+                        help='baseline JSON file to check the new runs against')
+    parser.add_argument('--time_tolerance', type=float, dest='time_tolerance', default=0.5,
+                        help='relative slowdown in wall time or time to first solution counted as a regression; default 0.5')
+    parser.add_argument('--objective_tolerance', type=float, dest='objective_tolerance', default=0.01,
+                        help='relative objective increase counted as a regression; default 0.01')
+    parser.add_argument('--memory_tolerance', type=float, dest='memory_tolerance', default=0.2,
+                        help='relative peak RSS increase counted as a regression; default 0.2')
+    args = parser.parse_args()
+
+    axes = [[int(n) for n in args.nodes.split(',')],
+            [int(p) for p in args.pairs.split(',')],
+            [float(f) for f in args.droppable.split(',')],
+            args.encodings.split(','),
+            args.metaheuristics.split(',')]
+    print('running', len(list(product(*axes))), 'benchmark runs,',
+          ', '.join('{} s for {} nodes'.format(scaled_timelimit(args, nodes), nodes)
+                    for nodes in axes[0]))
+
+    records = []
+    with ExitStack() as stack:
+        # every run of a node count maps one copy of its instance
+        files = {nodes: stack.enter_context(shared_instance_files(
+                     synthetic_data_model(nodes, 1, args.seed, as_lists=False)))
+                 for nodes in axes[0]}
+        jobs = [(dict(zip(run_fields, values)), args, files[values[0]])
+                for values in product(*axes)]
+        # a fresh process per run, so peak RSS is the run's own
+        with multiprocessing.Pool(args.workers, maxtasksperchild=1) as pool:
+            for record in pool.imap(run_one, jobs):
+                records.append(record)
+                print(json.dumps(record))
+    with open(args.output, 'w') as output:
+        json.dump({'seed': args.seed, 'timelimit': args.timelimit,
+                   'scale_nodes': args.scale_nodes,
+                   'capacity_slack': args.capacity_slack,
+                   'first_solution': args.first_solution,
+                   'penalty': args.penalty, 'runs': records},
+                  output, indent=1)
+    print('wrote', args.output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['runs']
+        tolerances = {'wall_time': args.time_tolerance,
+                      'build_time': args.time_tolerance,
+                      'solve_time': args.time_tolerance,
+                      'first_solution_time': args.time_tolerance,
+                      'objective': args.objective_tolerance,
+                      'peak_rss_kb': args.memory_tolerance}
+        found = regressions(baseline, records, tolerances)
+        for record, field, old, new in found:
+            print('REGRESSION', ' '.join('{}={}'.format(name, record[name])
+                                         for name in run_fields),
+                  field, old, '->', new)
+        print(len(found), 'regressions against', args.compare)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
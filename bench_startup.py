@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Benchmark and guard the startup time of the scripts.
+
+Every script is run with --help under python -X importtime, and
+disjunction_fail.py also on the smallest literal instance, so both the
+paths that need no solver and a short solve are covered.  The best of a
+few runs is reported as wall time and as time spent importing, with the
+heavy modules the run loaded.  A --help run that loads one of the
+--forbid modules, or takes longer than --max_help_ms to import, is
+reported as a regression and the benchmark exits with status 1, as is
+any run that exits with a non-zero status.  The scripts are found next
+to this one, whatever the working directory.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+help_scripts = [
+    'disjunction_fail.py',
+    'disjunction_fail_2.py',
+    'disjunction_fail_3.py',
+    'disjunction_okay.py',
+    'ExploringDisjunctions.py',
+    'sweep.py',
+    'solve_server.py',
+]
+
+# a short solve, as run from cron
+solve_command = ['disjunction_fail.py', '--four', '-t', '1']
+
+heavy_modules = ['ortools', 'numpy', 'six', 'pyarrow']
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# import time:  self [us] | cumulative | imported package
+importtime_line = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Returns (microseconds spent importing, top-level packages imported)."""
+    total = 0
+    packages = set()
+    for line in stderr.splitlines():
+        match = importtime_line.match(line)
+        if match is None:
+            continue
+        packages.add(match.group(4).split('.')[0])
+        if not match.group(3):
+            # only top-level imports, their cumulative time covers the rest
+            total += int(match.group(2))
+    return total, packages
+
+
+def time_command(command, repeat):
+    """Runs command under -X importtime repeat times.
+
+    The script command[0] is taken from script_dir.  Returns (wall ms,
+    import ms, packages, exit status) of the fastest run, or of the
+    first one that failed.
+    """
+    best = None
+    script = os.path.join(script_dir, command[0])
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run = subprocess.run([sys.executable, '-X', 'importtime', script] + command[1:],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+        wall = 1000 * (time.perf_counter() - start)
+        imports, packages = parse_importtime(run.stderr)
+        if run.returncode != 0:
+            return wall, imports / 1000, packages, run.returncode
+        if best is None or wall < best[0]:
+            best = (wall, imports / 1000, packages, 0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time script startup and check that --help stays free of heavy imports')
+    parser.add_argument('--repeat', type=int, dest='repeat', default=5,
+                        help='runs per command, best one reported; default 5')
+    parser.add_argument('--forbid', type=str, dest='forbid', default='ortools,numpy,six',
+                        help='comma separated packages a --help run may not import; default ortools,numpy,six')
+    parser.add_argument('--max_help_ms', type=float, dest='max_help_ms', default=None,
+                        help='import time budget of a --help run, in milliseconds')
+    args = parser.parse_args()
+
+    forbidden = set(args.forbid.split(',')) if args.forbid else set()
+    commands = [([script, '--help'], True) for script in help_scripts]
+    commands.append((solve_command, False))
+    print('{0:<40} {1:>9} {2:>10}  {3}'.format(
+        'command', 'wall ms', 'import ms', 'heavy imports'))
+    regressions = []
+    for command, is_help in commands:
+        wall, imports, packages, status = time_command(command, args.repeat)
+        heavy = [name for name in heavy_modules if name in packages]
+        print('{0:<40} {1:>9.1f} {2:>10.1f}  {3}'.format(
+            ' '.join(command), wall, imports, ','.join(heavy) or '-'))
+        if status != 0:
+            regressions.append((command, 'exits with status {}'.format(status)))
+        if not is_help:
+            continue
+        if forbidden & packages:
+            regressions.append((command, 'imports {}'.format(
+                ','.join(sorted(forbidden & packages)))))
+        if args.max_help_ms is not None and imports > args.max_help_ms:
+            regressions.append((command, 'imports take {:.1f} ms'.format(imports)))
+    for command, reason in regressions:
+        print('REGRESSION', ' '.join(command), reason)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Benchmark symmetry breaking between interchangeable vehicle pairs.
+
+Every pair of a synthetic fleet has the same capacities and costs, so
+any permutation of the pairs' routes is an equivalent solution.  The
+same instance is solved with the same search for a fixed time without
+symmetry breaking and with each --symmetry_breaking mode, and every
+solution is scored on the original matrix as in bench_exclusion.py.
+The best score any mode reaches stands in for the optimum, and each
+mode is reported with its own best score, the time of its first
+solution and the time it took to reach that best score (or '-').
+"""
+from functools import partial
+import argparse
+import time
+
+from disjunctions import add_solution_hooks
+from disjunctions import build_routing_model
+from disjunctions import record_improvement
+from disjunctions import search_parameters
+from disjunctions import synthetic_data_model
+
+
+modes = [None, 'used', 'size']
+
+
+def solve_trace(pairs, mode, args):
+    """Solves one mode; returns its list of (seconds, score) improvements."""
+    data = synthetic_data_model(pairs * args.nodes_per_pair + 1, pairs, args.seed)
+    original = dict(data)
+    manager, routing = build_routing_model(
+        data, matrix_transits=True, single_disjunctions=True,
+        singlepenalty=args.penalty, symmetry_breaking=mode,
+        **{args.encoding: True})
+    parameters = search_parameters(args.timelimit, args.first_solution,
+                                   args.metaheuristic)
+    trace = []
+    start = time.monotonic()
+    add_solution_hooks(routing).append(
+        partial(record_improvement, original, manager, routing, args.penalty,
+                trace, start))
+    routing.SolveWithParameters(parameters)
+    return trace
+
+
+def bench(pairs, args):
+    traces = [(mode or 'none', solve_trace(pairs, mode, args)) for mode in modes]
+    best = min(trace[-1][1] for (_, trace) in traces if trace)
+    for name, trace in traces:
+        if not trace:
+            print('{0:>6} {1:<6} {2:>10} {3:>10} {4:>10}'.format(
+                pairs, name, '-', '-', '-'))
+            continue
+        reached = [seconds for (seconds, score) in trace if score <= best]
+        print('{0:>6} {1:<6} {2:>10} {3:>10.3f} {4:>10}'.format(
+            pairs, name, trace[-1][1], trace[0][0],
+            '{:.3f}'.format(reached[0]) if reached else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare time to best score with and without pair symmetry breaking')
+    parser.add_argument('--pairs', type=str, dest='pairs', default='10,25,50',
+                        help='comma separated numbers of vehicle pairs; default 10,25,50')
+    parser.add_argument('--nodes_per_pair', type=int, dest='nodes_per_pair', default=5,
+                        help='demand nodes generated per vehicle pair; default 5')
+    parser.add_argument('--encoding', type=str, dest='encoding', default='vehicle_used_constraint',
+                        choices=['cumulative_constraint', 'count_constraint',
+                                 'vehicle_used_constraint'],
+                        help='pair exclusion encoding; default vehicle_used_constraint')
+    parser.add_argument('--penalty', type=int, dest='penalty', default=100000,
+                        help='penalty for dropping a node; default 100000')
+    parser.add_argument('-t,--timelimit', type=int, dest='timelimit', default=10,
+                        help='search time per mode, in seconds; default 10')
+    parser.add_argument('--first_solution', type=str, dest='first_solution',
+                        default='GLOBAL_CHEAPEST_ARC',
+                        help='first solution strategy; default GLOBAL_CHEAPEST_ARC')
+    parser.add_argument('--metaheuristic', type=str, dest='metaheuristic',
+                        default='GUIDED_LOCAL_SEARCH',
+                        help='local search metaheuristic; default GUIDED_LOCAL_SEARCH')
+    parser.add_argument('--seed', type=int, dest='seed', default=0,
+                        help='seed of the synthetic instances; default 0')
+    args = parser.parse_args()
+
+    print('{0:>6} {1:<6} {2:>10} {3:>10} {4:>10}'.format(
+        'pairs', 'mode', 'score', 'first s', 'to best s'))
+    for pairs in [int(p) for p in args.pairs.split(',')]:
+        bench(pairs, args)
+
+
+if __name__ == '__main__':
+    main()
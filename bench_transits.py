@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Benchmark Python transit callbacks against solver-side transit matrices.
+
+Plain callbacks, callbacks reading the matrix as one flat table and
+multiplying by the cost class on every call, the same callbacks
+reading a CompactMatrix, and solver-side matrices run the same
+deterministic search (fixed first solution strategy, no time limit, a
+fixed solution limit), so the solver evaluates the same arcs in all
+four.  The number of evaluations is counted once with
+instrumented callbacks, then each mode is timed without
+instrumentation and reported as arcs evaluated per second, with the
+speedups of the table, compact matrices and matrices over plain
+callbacks.
+"""
+from ortools.constraint_solver import pywrapcp
+from ortools.constraint_solver import routing_enums_pb2
+from functools import partial
+import argparse
+import time
+
+import disjunction_fail
+import disjunctions
+from disjunctions import synthetic_data_model
+
+
+# the 16 demand node instance of vrp_drop_nodes_2.cc --real_distances,
+# depot first
+real_distance_matrix = [
+    [0, 5480, 7760, 6960, 5820, 2740, 5020, 1940, 3080, 1940, 5360, 5020, 3880, 3540, 4680, 7760, 6620],
+    [5480, 0, 684, 308, 194, 502, 730, 354, 696, 742, 1084, 594, 480, 674, 1016, 868, 1210],
+    [7760, 684, 0, 992, 878, 502, 274, 810, 468, 742, 400, 1278, 1164, 1130, 788, 1552, 754],
+    [6960, 308, 992, 0, 114, 650, 878, 502, 844, 890, 1232, 514, 628, 822, 1164, 560, 1358],
+    [5820, 194, 878, 114, 0, 536, 764, 388, 730, 776, 1118, 400, 514, 708, 1050, 674, 1244],
+    [2740, 502, 502, 650, 536, 0, 228, 308, 194, 240, 582, 776, 662, 628, 514, 1050, 708],
+    [5020, 730, 274, 878, 764, 228, 0, 536, 194, 468, 354, 1004, 890, 856, 514, 1278, 480],
+    [1940, 354, 810, 502, 388, 308, 536, 0, 342, 388, 730, 468, 354, 320, 662, 742, 856],
+    [3080, 696, 468, 844, 730, 194, 194, 342, 0, 274, 388, 810, 696, 662, 320, 1084, 514],
+    [1940, 742, 742, 890, 776, 240, 468, 388, 274, 0, 342, 536, 422, 388, 274, 810, 468],
+    [5360, 1084, 400, 1232, 1118, 582, 354, 730, 388, 342, 0, 878, 764, 730, 388, 1152, 354],
+    [5020, 594, 1278, 514, 400, 776, 1004, 468, 810, 536, 878, 0, 114, 308, 650, 274, 844],
+    [3880, 480, 1164, 628, 514, 662, 890, 354, 696, 422, 764, 114, 0, 194, 536, 388, 730],
+    [3540, 674, 1130, 822, 708, 628, 856, 320, 662, 388, 730, 308, 194, 0, 342, 422, 536],
+    [4680, 1016, 788, 1164, 1050, 514, 514, 662, 320, 274, 388, 650, 536, 342, 0, 764, 194],
+    [7760, 868, 1552, 560, 674, 1050, 1278, 742, 1084, 810, 1152, 274, 388, 422, 764, 0, 798],
+    [6620, 1210, 754, 1358, 1244, 708, 480, 856, 514, 468, 354, 844, 730, 536, 194, 798, 0]
+]
+
+
+def real_data_model(vehicles=2):
+    """The real distances instance with vrp_drop_nodes_2.cc's default demands, capacities and costs."""
+    return {'distance_matrix': [list(row) for row in real_distance_matrix],
+            'demands': [0] + [1] * (len(real_distance_matrix) - 1),
+            'vehicle_capacities': [5, 1] * vehicles,
+            'vehicle_costs': [10, 1] * vehicles,
+            'depot': 0}
+
+
+def builtin_data_model(size4=False, size7=False, vehicles=2):
+    """One of the literal instances from disjunction_fail.create_data_model."""
+    args = argparse.Namespace(size4=size4, size7=size7, vehicles=vehicles,
+                              combo_capacity=3, single_capacity=1,
+                              combo_cost=5, single_cost=1)
+    return disjunction_fail.create_data_model(args)
+
+
+def counting(counter, callback):
+    """Wraps a transit callback so every call bumps counter[0]."""
+    def wrapped(*args):
+        counter[0] += 1
+        return callback(*args)
+    return wrapped
+
+
+def build_and_solve(data, mode, solution_limit, counter=None):
+    """Builds the cost and capacity model and solves it; returns (objective, seconds)."""
+    num_veh = len(data['vehicle_costs'])
+    num_nodes = len(data['distance_matrix'])
+    manager = pywrapcp.RoutingIndexManager(num_nodes, num_veh, data['depot'])
+    routing = pywrapcp.RoutingModel(manager)
+
+    if mode == 'matrix':
+        (_, vehicle_transits,
+         demand_callback_index) = disjunctions.register_matrix_transits(data, routing)
+    elif mode in ('table', 'compact'):
+        if mode == 'compact':
+            data = dict(data, distance_matrix=disjunctions.CompactMatrix.from_matrix(
+                data['distance_matrix']))
+        (_, vehicle_transits,
+         demand_callback_index) = disjunctions.register_table_transits(
+             data, manager, routing)
+    elif counter is None:
+        (_, vehicle_transits,
+         demand_callback_index) = disjunctions.register_callback_transits(
+             data, manager, routing)
+    else:
+        vehicle_transits = [
+            routing.RegisterTransitCallback(counting(counter, partial(
+                disjunctions.vehicle_distance_callback, data, v, manager)))
+            for v in range(0, num_veh)]
+        demand_callback_index = routing.RegisterUnaryTransitCallback(
+            counting(counter, partial(disjunctions.demand_callback, data, manager)))
+
+    for (t, v) in zip(vehicle_transits, range(0, num_veh)):
+        routing.SetArcCostEvaluatorOfVehicle(t, v)
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback_index, 0, data['vehicle_capacities'], True, 'Capacity')
+    node_disjunctions = [routing.AddDisjunction([manager.NodeToIndex(i)], 100000)
+                    for i in range(1, len(data['demands']))]
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
+    search_parameters.solution_limit = solution_limit
+
+    start = time.perf_counter()
+    assignment = routing.SolveWithParameters(search_parameters)
+    elapsed = time.perf_counter() - start
+    objective = assignment.ObjectiveValue() if assignment else None
+    return objective, elapsed
+
+
+def bench(name, data, solution_limit, repeat):
+    counter = [0]
+    objective, _ = build_and_solve(data, 'callback', solution_limit, counter)
+    row = [name, len(data['distance_matrix']), counter[0]]
+    for mode in ('callback', 'table', 'compact', 'matrix'):
+        best = None
+        for _ in range(repeat):
+            mode_objective, elapsed = build_and_solve(data, mode, solution_limit)
+            assert mode_objective == objective, (mode, mode_objective, objective)
+            best = elapsed if best is None else min(best, elapsed)
+        row.append(counter[0] / best)
+    row.extend([row[4] / row[3], row[5] / row[3], row[6] / row[3]])
+    print('{0:<12} {1:>6} {2:>12} {3:>14.0f} {4:>14.0f} {5:>14.0f} {6:>14.0f} {7:>8.1f}x {8:>8.1f}x {9:>8.1f}x'.format(*row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare arcs evaluated per second with Python callbacks, tables, compact matrices and solver-side matrices')
+    parser.add_argument('--solution_limit', type=int, dest='solution_limit', default=50,
+                        help='number of solutions the search may find before stopping; default 50')
+    parser.add_argument('--repeat', type=int, dest='repeat', default=3,
+                        help='timed runs per mode, best one reported; default 3')
+    parser.add_argument('--synthetic_nodes', type=int, dest='synthetic_nodes', default=1000,
+                        help='node count of the synthetic instances; default 1000')
+    parser.add_argument('--seeds', type=int, dest='seeds', default=2,
+                        help='number of synthetic instances to generate; default 2')
+    args = parser.parse_args()
+
+    print('{0:<12} {1:>6} {2:>12} {3:>14} {4:>14} {5:>14} {6:>14} {7:>9} {8:>9} {9:>9}'.format(
+        'instance', 'nodes', 'evaluations', 'callback arc/s', 'table arc/s',
+        'compact arc/s', 'matrix arc/s', 'table', 'compact', 'matrix'))
+    bench('four', builtin_data_model(size4=True), args.solution_limit, args.repeat)
+    bench('five', builtin_data_model(), args.solution_limit, args.repeat)
+    bench('seven', builtin_data_model(size7=True), args.solution_limit, args.repeat)
+    data = builtin_data_model(size7=True)
+    disjunctions.vehicle_pair_dummy_nodes(data, len(data['vehicle_costs'])//2)
+    bench('seven-fake', data, args.solution_limit, args.repeat)
+    bench('sixteen-real', real_data_model(), args.solution_limit, args.repeat)
+    for seed in range(0, args.seeds):
+        data = synthetic_data_model(args.synthetic_nodes,
+                                    max(1, args.synthetic_nodes // 100), seed)
+        bench('synthetic-{}'.format(seed), data, args.solution_limit, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,19 @@
 #!/usr/bin/env python3
-from six.moves import xrange
-from ortools.constraint_solver import pywrapcp
-from ortools.constraint_solver import routing_enums_pb2
+from contextlib import contextmanager
+from contextlib import redirect_stdout
 from functools import partial
 from itertools import chain
 import argparse
-import numpy as np
-
-def vehicle_dummy_nodes(data):
-    """slot in a dummy node for this vehicle.  Must go to dummy node from depot"""
-    matrix = data['distance_matrix']
-    regular_nodes = range(1,len(data['demands']))
-    new_node = len(matrix[0])
-    # distance from depot to new node is 0, from new node to all other
-    # nodes is 0, but only given vehicle can fisit new node
-    for rowidx in range(len(matrix)):
-        row = matrix[rowidx]
-
-        if rowidx == 0:
-            # fix up first row
-            for node in regular_nodes:
-                row[node] = 1
-            row.append(0) # free to get from depot to dummy node
-        else:
-            row.append(10000) # discourage trip to dummy nodes from dummy nodes
-
-        matrix[rowidx] = row
-    new_row = list(10000*np.ones_like(matrix[0]))
-    new_row[0] = 0 # free to get from new node back to depot
-    for node in regular_nodes:
-        new_row[node] = 3 # just like regular depot to node cost
-    matrix.append(new_row)
-    data['distance_matrix'] = matrix
-    return new_node
+import cProfile
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import time
+
+import disjunctions
 
 def vehicle_node_constraints(node, vehnum, routing, manager):
     idx = manager.NodeToIndex(node)
@@ -41,7 +22,14 @@ def vehicle_node_constraints(node, vehnum, routing, manager):
 def create_data_model(args):
     """Stores the data for the problem."""
     data = {}
-    if args.size4:
+    if getattr(args, 'distance_matrix', None) is not None:
+        # an instance given inline, as by solve_server.py
+        data['distance_matrix'] = args.distance_matrix
+        data['demands'] = args.demands
+    elif getattr(args, 'matrix_file', None):
+        data['distance_matrix'], data['demands'] = disjunctions.load_instance(
+            args.matrix_file, args.demands_file)
+    elif args.size4:
         data['distance_matrix'] = [
             [0, 3, 3, 3, 3],
             [3, 0, 1, 1, 1],
@@ -93,66 +81,45 @@ def create_data_model(args):
     return data
 
 
-def print_solution(data, manager, routing, assignment):
-    """Prints assignment on console."""
-    total_distance = 0
-    total_load = 0
-    num_demand_nodes = len(data['demands'])
-    countd = routing.GetDimensionOrDie('count')
-    for vehicle_id in range(0,len(data['vehicle_costs'])):
-        index = routing.Start(vehicle_id)
-        plan_output = 'Route for vehicle {}:\n'.format(vehicle_id)
-        route_distance = 0
-        route_load = 0
-        arc_cost = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            load = 0
-            if node_index < num_demand_nodes:
-                load = data['demands'][node_index]
-            route_load += load
-            plan_output += ' {0} Load({1}) Cost({2}) Count({3})-> '.format(node_index, route_load, arc_cost, assignment.Value(countd.CumulVar(index)))
-            previous_index = index
-            index = assignment.Value(routing.NextVar(index))
-            arc_cost = routing.GetArcCostForVehicle(
-                previous_index, index, vehicle_id)
-            route_distance += arc_cost
-        plan_output += ' {0} Load({1}) Cost({2}) Count({3})\n'.format(
-            manager.IndexToNode(index), route_load, arc_cost, assignment.Value(countd.CumulVar(index)))
-        plan_output += 'Distance of the route: {}m\n'.format(route_distance)
-        plan_output += 'Load of the route: {}\n'.format(route_load)
-        print(plan_output)
-        total_distance += route_distance
-        total_load += route_load
-    print('Total distance of all routes: {}m'.format(total_distance))
-    print('Total load of all routes: {}'.format(total_load))
-
-# Create and register a transit callback.
-def distance_callback(data, manager, from_index, to_index):
-    """Returns the distance between the two nodes."""
-    # Convert from routing variable Index to distance matrix NodeIndex.
-    from_node = manager.IndexToNode(from_index)
-    to_node = manager.IndexToNode(to_index)
-    return data['distance_matrix'][from_node][to_node]
-
-def vehicle_distance_callback(data, vehicle, manager, from_index, to_index):
-    """Returns the distance between the two nodes for a vehicle."""
-    # Convert from routing variable Index to distance matrix NodeIndex.
-    from_node = manager.IndexToNode(from_index)
-    to_node = manager.IndexToNode(to_index)
-    # print(from_node,to_node,data['distance_matrix'][from_node][to_node]*data['vehicle_costs'][vehicle])
-    return data['distance_matrix'][from_node][to_node]*data['vehicle_costs'][vehicle]
-
-def demand_callback(data, manager,from_index):
-    """Returns the demand of the node."""
-    # Convert from routing variable Index to demands NodeIndex.
-    from_node = manager.IndexToNode(from_index)
-    if from_node < len( data['demands'] ):
-        return data['demands'][from_node]
-    return 0
-
-
-def main():
+# first solution strategies, with how each fares on the literal instances
+first_solution_strategies = [
+    'LOCAL_CHEAPEST_ARC',            # works
+    'GLOBAL_CHEAPEST_ARC',           # works
+    'SAVINGS',                       # works
+    'FIRST_UNBOUND_MIN_VALUE',       # crazy suboptimal
+    'AUTOMATIC',                     # suboptimal
+    'PATH_CHEAPEST_ARC',             # suboptimal
+    'PATH_MOST_CONSTRAINED_ARC',     # suboptimal
+    'PARALLEL_CHEAPEST_INSERTION',   # no assignment
+    'LOCAL_CHEAPEST_INSERTION',      # no assignment
+    'ALL_UNPERFORMED',               # no assignment
+    'BEST_INSERTION',                # no assignment
+    'CHRISTOFIDES',                  # no assginment
+    'SWEEP',                         # no assignment
+    'SEQUENTIAL_CHEAPEST_INSERTION', # no assignment
+]
+
+metaheuristics = [
+    'AUTOMATIC',
+    'GREEDY_DESCENT',
+    'GUIDED_LOCAL_SEARCH',
+    'SIMULATED_ANNEALING',
+    'TABU_SEARCH',
+    'GENERIC_TABU_SEARCH',
+]
+
+# the strategies that work, with and without guided local search
+default_portfolio = [
+    'GLOBAL_CHEAPEST_ARC',
+    'LOCAL_CHEAPEST_ARC',
+    'SAVINGS',
+    'GLOBAL_CHEAPEST_ARC/GUIDED_LOCAL_SEARCH',
+    'LOCAL_CHEAPEST_ARC/GUIDED_LOCAL_SEARCH',
+    'SAVINGS/GUIDED_LOCAL_SEARCH',
+]
+
+def build_parser():
+    """Returns the command line parser describing every model and search option."""
     parser = argparse.ArgumentParser(description='Play around with various options relating to disjunctions')
     parser.add_argument('-d,--disjunctions', action='store_true', dest='single_disjunctions',
                         default=False,
@@ -177,6 +144,24 @@ def main():
     parser.add_argument('--fake_nodes_constraints', action='store_true', dest='fake_nodes_constraints',
                         default=False,
                         help='whether or not to use vehicle-specific fake nodes to prevent single unit and combo truck from being used simultaneously')
+    parser.add_argument('--count_constraint', action='store_true', dest='count_constraint',
+                        default=False,
+                        help='whether or not to use constraints on the end counts to prevent single unit and combo truck from being used simultaneously')
+    parser.add_argument('--vehicle_used_constraint', action='store_true', dest='vehicle_used_constraint',
+                        default=False,
+                        help='whether or not to use the routing vehicle-used indicators to prevent single unit and combo truck from being used simultaneously')
+    parser.add_argument('-c,--cardinality_disjunction', action='store_true', dest='cardinality_disjunction',
+                        default=False,
+                        help='whether or not to use the max cardinality disjunction across all nodes')
+    parser.add_argument('-p,--cardinality_penalty', type=int, dest='cardinality_penalty', default=0,
+                        help='penalty value to use for cardinality disjunction; defaults to 10 times the combo cost plus one')
+    parser.add_argument('--cardinality', type=int, dest='cardinality', default=2,
+                        help='max cardinality to use')
+    parser.add_argument('--neighbors', type=int, dest='neighbors', default=0,
+                        help='only allow arcs from each node to its this many nearest nodes, plus the depot and dummy nodes; default 0 (all arcs)')
+    parser.add_argument('--symmetry_breaking', type=str, dest='symmetry_breaking', default=None,
+                        choices=['used', 'size'],
+                        help='order the use of interchangeable vehicle pairs: used lets a pair run only when the one before it does, size keeps each pair from visiting more nodes than the one before it')
     parser.add_argument('-v,--vehicles', type=int, dest='vehicles', default=2,
                         help='number of vehicles to use, each optionally being either a single unit (just the truck) or a combo unit (truck + trailer)')
     parser.add_argument('--combo_cost', type=int, dest='combo_cost', default=5,
@@ -192,177 +177,682 @@ def main():
     parser.add_argument('--guided_local', action='store_true', dest='guided_local',
                         default=False,
                         help='whether or not to use the guided local search metaheuristic')
-    args = parser.parse_args()
-
-
-    """Solve the CVRP problem."""
+    parser.add_argument('--matrix_transits', action='store_true', dest='matrix_transits',
+                        default=False,
+                        help='whether or not to register precomputed distance, cost and demand matrices with the solver instead of Python callbacks')
+    parser.add_argument('--table_transits', action='store_true', dest='table_transits',
+                        default=False,
+                        help='whether or not to have the Python callbacks read the distance matrix as one flat table, multiplied by the cost class on every call')
+    parser.add_argument('--compact_matrix', action='store_true', dest='compact_matrix',
+                        default=False,
+                        help='whether or not to hold the distance matrix as its upper triangle when symmetric, in the narrowest integer type that fits')
+    parser.add_argument('--matrix_file', type=str, dest='matrix_file', default=None,
+                        help='read the distance matrix from this .npy or raw int64 file instead of the literal instances')
+    parser.add_argument('--demands_file', type=str, dest='demands_file', default=None,
+                        help='read node demands from this .npy or raw int64 file; defaults to 1 per non-depot node')
+    parser.add_argument('--save_instance', type=str, dest='save_instance', default=None,
+                        help='write the instance to <prefix>_matrix.npy and <prefix>_demands.npy before solving')
+    parser.add_argument('--first_solution', type=str, dest='first_solution',
+                        default='GLOBAL_CHEAPEST_ARC',
+                        choices=first_solution_strategies,
+                        help='first solution strategy; default GLOBAL_CHEAPEST_ARC')
+    parser.add_argument('--metaheuristic', type=str, dest='metaheuristic', default=None,
+                        choices=metaheuristics,
+                        help='local search metaheuristic; --guided_local takes precedence')
+    parser.add_argument('--fallback_strategies', type=str, dest='fallback_strategies', default=None,
+                        help='comma separated first solution strategies to try in turn when the one before finds no first solution within --first_solution_time, e.g. GLOBAL_CHEAPEST_ARC,SAVINGS')
+    parser.add_argument('--first_solution_time', type=int, dest='first_solution_time', default=5,
+                        help='seconds each strategy but the last of the fallback chain may take to find a first solution; default 5')
+    parser.add_argument('--skip_precheck', action='store_true', dest='skip_precheck',
+                        default=False,
+                        help='whether or not to solve even when the instance and options are known to have no solution')
+    parser.add_argument('--target_objective', type=int, dest='target_objective', default=None,
+                        help='stop searching as soon as a solution with this objective or better is found')
+    parser.add_argument('--plateau', type=float, dest='plateau', default=None,
+                        help='stop searching after this many seconds without an improving solution')
+    parser.add_argument('--lower_bound', type=int, dest='lower_bound', default=None,
+                        help='known lower bound on the objective; stop once within --gap of it')
+    parser.add_argument('--gap', type=float, dest='gap', default=0.0,
+                        help='relative gap to --lower_bound at which to stop; default 0 (stop at the bound)')
+    parser.add_argument('--solution_limit', type=int, dest='solution_limit', default=None,
+                        help='stop searching after this many solutions')
+    parser.add_argument('--portfolio', action='store_true', dest='portfolio',
+                        default=False,
+                        help='whether or not to race several strategies in parallel processes and keep the best solution')
+    parser.add_argument('--portfolio_members', type=str, dest='portfolio_members',
+                        default=','.join(default_portfolio),
+                        help='comma separated STRATEGY or STRATEGY/METAHEURISTIC entries to race, one process each; default {}'.format(','.join(default_portfolio)))
+    parser.add_argument('--profile', action='store_true', dest='profile',
+                        default=False,
+                        help='whether or not to count calls and time in each Python transit callback and report them against the solve time')
+    parser.add_argument('--profile_file', type=str, dest='profile_file', default=None,
+                        help='write cProfile statistics of the solve to this file, for pstats')
+    parser.add_argument('--auto_encoding', action='store_true', dest='auto_encoding',
+                        default=False,
+                        help='whether or not to probe every encoding on a sample of the instance in parallel and solve with the one reaching the lowest score, the quickest among ties')
+    parser.add_argument('--probe_time', type=int, dest='probe_time', default=5,
+                        help='seconds each encoding probe may search, taken from --timelimit; default 5')
+    parser.add_argument('--probe_nodes', type=int, dest='probe_nodes', default=200,
+                        help='nodes in the sample the encodings are probed on; default 200')
+    parser.add_argument('--probe_file', type=str, dest='probe_file', default='encoding_probes.json',
+                        help='file recording probe results, so similar instances skip the probe; default encoding_probes.json')
+    parser.add_argument('--decompose', type=int, dest='decompose', default=0,
+                        help='split the demand nodes into this many clusters, at most one per vehicle pair, and solve them in parallel; 0 solves the whole instance')
+    parser.add_argument('--improve_time', type=int, dest='improve_time', default=0,
+                        help='with --decompose, seconds to improve the stitched routes on the whole instance; default 0')
+    parser.add_argument('--save_routes', type=str, dest='save_routes', default=None,
+                        help='write the final routes to this file for a later --warm_start')
+    parser.add_argument('--warm_start', type=str, dest='warm_start', default=None,
+                        help='start the search from routes saved with --save_routes instead of a first solution strategy')
+    parser.add_argument('--solution_output', type=str, dest='solution_output', default=None,
+                        help='write the routes as columns to this file, Arrow for .arrow or .feather (needs pyarrow), JSON otherwise')
+    parser.add_argument('--progress', type=str, dest='progress', default=None,
+                        help='write one JSON line per improving solution (elapsed ms, objective, dropped nodes, active vehicles) to this file')
+    return parser
+
+
+def build_model(args, cache=None, progress=None, callback_stats=None):
+    """Builds the model described by args without solving it.
+
+    With a ModelCache the model is taken from it when the same instance
+    was built before with the same options.  Improving solutions are
+    written to the progress stream, if one is given.  A callback_stats
+    dict gets the transit callbacks profiled into it, and the model is
+    then always built afresh.  Returns (data, manager, routing,
+    search_parameters, hooks), hooks being the SolutionHooks the
+    stopping rules were added to.
+    """
     # Instantiate the data problem.
     data = create_data_model(args)
-    num_veh = len(data['vehicle_costs'])
-    # assert num_veh == 2 * args.vehicles
-    # assert num_veh == len(data['vehicle_capacities'])
+    if args.save_instance:
+        disjunctions.save_instance(data, args.save_instance)
+    if args.compact_matrix:
+        data['distance_matrix'] = disjunctions.CompactMatrix.from_matrix(
+            data['distance_matrix'])
 
+    metaheuristic = args.metaheuristic
+    if args.guided_local:
+        metaheuristic = 'GUIDED_LOCAL_SEARCH'
+    if cache is None or callback_stats is not None:
+        manager, routing = disjunctions.build_routing_model(
+            data, callback_stats, **disjunctions.model_options(args))
+        hooks = disjunctions.add_solution_hooks(routing)
+    else:
+        # the model keeps the strategies it is first solved with
+        data, manager, routing, hooks = cache.get(
+            data, disjunctions.model_options(args), (args.first_solution, metaheuristic))
     if args.fake_nodes:
-        for veh_pair in range(0, num_veh//2):
-            newnode_1 = vehicle_dummy_nodes(data)
-            newnode_2 = vehicle_dummy_nodes(data)
         print(data['distance_matrix'])
-
-    num_nodes = len(data['distance_matrix'])
-    # Create the routing index manager.
-    manager = pywrapcp.RoutingIndexManager(
-        num_nodes, num_veh, data['depot'])
-
-    # Create Routing Model.
-    routing = pywrapcp.RoutingModel(manager)
-    solver = routing.solver()
-
-    transit_callback_index = routing.RegisterTransitCallback(partial(distance_callback,
-                                                                     data,
-                                                                     manager))
-
-    # use per-vehicle arc cost evaluators
-
-    vehicle_transits = [
-        routing.RegisterTransitCallback(
-            partial(vehicle_distance_callback, data, v, manager)
-        ) for v in range(0,num_veh)]
-
-    vehicle_costs = [
-        routing.SetArcCostEvaluatorOfVehicle(
-            t,v
-        ) for (t,v) in zip(vehicle_transits,
-                           range(0,num_veh))]
-
-    # create travel cost dimension dependent on vehicle type
-    routing.AddDimensionWithVehicleTransits(
-        vehicle_transits,
-        0,      # no slack
-        300000, # some really large time
-        True,
-        "Cost")
-    cost_dimension = routing.GetDimensionOrDie("Cost")
-
-    # Add Capacity constraint.
-    demand_callback_index = routing.RegisterUnaryTransitCallback(
-        partial(demand_callback, data, manager))
-    routing.AddDimensionWithVehicleCapacity(
-        demand_callback_index,
-        0,  # null capacity slack
-        data['vehicle_capacities'],  # vehicle maximum capacities
-        True,  # start cumul to zero
-        'Capacity')
-
-
-    # count
-    count_dimension_name = 'count'
-    routing.AddConstantDimension(
-        1, # increment by one every time
-        num_nodes,  # max count is visit all the nodes
-        True,  # set count to zero
-        count_dimension_name)
-    count_dimension = routing.GetDimensionOrDie(count_dimension_name)
-
-    # set constraints such that truck, truck and trailer cannot both be used
-    for veh_pair in range(0, num_veh//2):
-        # buggy dead reckoning, but truck-trailer is first, truck single unit second
-        combo = veh_pair*2
-        single = veh_pair*2 + 1
-        if args.cumulative_constraint:
-            index_combo = routing.End(combo)
-            index_single = routing.End(single)
-
-            end_time_combo = cost_dimension.CumulVar(index_combo)
-            end_time_single = cost_dimension.CumulVar(index_single)
-
-            combo_on = end_time_combo > 0
-            single_on = end_time_single > 0
-
-            # constrain solver to prevent both being on
-            # truth table
-            #
-            # combo_on     single_on   multiply  descr
-            #   0             0           0      both unused; okay
-            #   1             0           0      combo on only; okay
-            #   0             1           0      single on only; okay
-            #   1             1           1      both on; prevent
-            #
-            solver.Add(combo_on * single_on == 0)
-        if args.fake_nodes_constraints:
-            newnode_1 = manager.NodeToIndex(len(data['demands']) + 2*veh_pair)
-            newnode_2 = manager.NodeToIndex(len(data['demands']) + 2*veh_pair + 1)
-
-            node1_on = routing.VehicleVar(newnode_1) > -1
-            node1_combo = routing.VehicleVar(newnode_1) == combo
-            node2_on = routing.VehicleVar(newnode_2) > -1
-            node2_single = routing.VehicleVar(newnode_2) == single
-            conditional_1 = solver.ConditionalExpression(
-                node1_on, node1_combo, 1)
-            conditional_2 = solver.ConditionalExpression(
-                node2_on, node2_single, 1)
-
-            solver.Add(conditional_1>=1)
-            solver.Add(conditional_2>=1)
-            # routing.AddDisjunction([newnode_1, newnode_2], -1, 1)
-
-            # Force dummy nodes to go first
-            count_dimension.SetCumulVarSoftUpperBound(newnode_1,
-                                                      1,
-                                                      1000000)
-            count_dimension.SetCumulVarSoftUpperBound(newnode_2,
-                                                      1,
-                                                      1000000)
-
-            #Force minimal usage?
-            index_combo = routing.End(combo)
-            index_single = routing.End(single)
-            combo_used = count_dimension.CumulVar(index_combo) > 2
-            single_used = count_dimension.CumulVar(index_single) > 2
-
-            solver.Add(combo_used * single_used == 0)
-
-
-
-
-    # optional disjunctions, depending on command line args
+    if args.cardinality_disjunction:
+        print('added one max cardinality disjunction across all nodes')
     if args.single_disjunctions:
         print('single node disjunction penalty is',args.singlepenalty)
-        disjunctions = [routing.AddDisjunction([manager.NodeToIndex(i)],args.singlepenalty)
-                        for i in range(1,len(data['demands']))]
-        print('added',len(disjunctions),'disjunctions, one per node')
+        print('added',len(data['demands']) - 1,'disjunctions, one per node')
+
     # Setting parameters and first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.time_limit.seconds =  args.timelimit  # timelimit
-    search_parameters.local_search_operators.use_path_lns = pywrapcp.BOOL_TRUE
-    search_parameters.local_search_operators.use_inactive_lns = pywrapcp.BOOL_TRUE
-    search_parameters.lns_time_limit.seconds = 10000  # 10000 milliseconds
-    search_parameters.first_solution_strategy = (
-        # routing_enums_pb2.FirstSolutionStrategy.LOCAL_CHEAPEST_ARC)  # works
-        routing_enums_pb2.FirstSolutionStrategy.GLOBAL_CHEAPEST_ARC) # works
-        # routing_enums_pb2.FirstSolutionStrategy.SAVINGS)    # works
-        # routing_enums_pb2.FirstSolutionStrategy.FIRST_UNBOUND_MIN_VALUE)    # crazy suboptimal
-        # routing_enums_pb2.FirstSolutionStrategy.AUTOMATIC)    # suboptimal
-        # routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)   # suboptimal
-        # routing_enums_pb2.FirstSolutionStrategy.PATH_MOST_CONSTRAINED_ARC) # suboptimal
-        # routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION) # no assignment
-        # routing_enums_pb2.FirstSolutionStrategy.LOCAL_CHEAPEST_INSERTION)    # no assignment
-        # routing_enums_pb2.FirstSolutionStrategy.ALL_UNPERFORMED) # no assignment
-        # routing_enums_pb2.FirstSolutionStrategy.BEST_INSERTION)    # no assignment
-        # routing_enums_pb2.FirstSolutionStrategy.CHRISTOFIDES)    # no assginment
-        # routing_enums_pb2.FirstSolutionStrategy.SWEEP)    # no assignment
-        # routing_enums_pb2.FirstSolutionStrategy.SEQUENTIAL_CHEAPEST_INSERTION) # no assignment
-    if args.guided_local:
-        search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
+    parameters = disjunctions.search_parameters(
+        args.timelimit, args.first_solution, metaheuristic, args.log_search)
+
+    if args.target_objective is not None:
+        hooks.append(partial(stop_at_target, routing, args.target_objective))
+    if args.lower_bound is not None:
+        hooks.append(partial(stop_at_gap, routing, args.lower_bound, args.gap))
+    if args.plateau is not None:
+        hooks.append(partial(stop_on_plateau, routing, args.plateau,
+                             {'best': None, 'since': None}))
+    if progress is not None:
+        hooks.append(partial(report_progress, data, manager, routing, progress,
+                             {'start': time.monotonic(), 'best': None}))
+    if args.solution_limit is not None:
+        parameters.solution_limit = args.solution_limit
+
+    return data, manager, routing, parameters, hooks
+
+
+def precheck(args):
+    """Returns why the model described by args can have no solution; see infeasibility_reasons.
+
+    Nothing is checked with --skip_precheck, nor with --auto_encoding,
+    whose encoding is not known yet.
+    """
+    if args.skip_precheck or args.auto_encoding:
+        return []
+    return disjunctions.infeasibility_reasons(
+        create_data_model(args), **disjunctions.model_options(args))
+
+
+def fallback_chain(args):
+    """Returns the first solution strategies to try in turn: --first_solution, then the fallbacks."""
+    chain = [args.first_solution]
+    if args.fallback_strategies:
+        chain.extend(strategy for strategy in args.fallback_strategies.split(',')
+                     if strategy not in chain)
+    return chain
+
+
+def first_solution(args, cache=None, progress=None, callback_stats=None):
+    """Builds the model with the first strategy of the fallback chain that finds a solution.
+
+    Every strategy but the last one gets args.first_solution_time
+    seconds to find a first solution on a model of its own, since a
+    model keeps the strategy it was first solved with.  Returns (data,
+    manager, routing, search_parameters, hooks, assignment): assignment
+    is the first solution found, to be improved for what is left of
+    args.timelimit, or None when it falls to the last strategy, whose
+    model is then solved as usual.  search_parameters is None once the
+    time limit has run out, and there is nothing left to solve.
+    """
+    start = time.monotonic()
+    chain = fallback_chain(args)
+    for strategy in chain:
+        attempt_args = argparse.Namespace(**vars(args))
+        attempt_args.first_solution = strategy
+        if callback_stats is not None:
+            callback_stats.clear()
+        data, manager, routing, search_parameters, hooks = build_model(
+            attempt_args, cache, progress, callback_stats)
+        remaining = args.timelimit - (time.monotonic() - start)
+        if remaining <= 0:
+            print('no time left to try', strategy)
+            return data, manager, routing, None, hooks, None
+        search_parameters.time_limit.FromNanoseconds(int(remaining * 1e9))
+        if strategy == chain[-1]:
+            return data, manager, routing, search_parameters, hooks, None
+        probe_time = min(args.first_solution_time, remaining)
+        first_parameters = type(search_parameters)()
+        first_parameters.CopyFrom(search_parameters)
+        first_parameters.solution_limit = 1
+        first_parameters.time_limit.FromNanoseconds(int(probe_time * 1e9))
+        probe_start = time.monotonic()
+        assignment = routing.SolveWithParameters(first_parameters)
+        raise_hook_errors(hooks)
+        if assignment:
+            # the improvement gets what the probes left of the time limit
+            remaining = args.timelimit - (time.monotonic() - start)
+            if remaining <= 0:
+                print(strategy, 'found a first solution with no time left to improve it')
+                return data, manager, routing, None, hooks, assignment
+            search_parameters.time_limit.FromNanoseconds(int(remaining * 1e9))
+            return data, manager, routing, search_parameters, hooks, assignment
+        print(strategy, 'found no first solution in',
+              round(time.monotonic() - probe_start, 1), 's of its',
+              round(probe_time, 1), 's limit, falling back')
+
+
+def solve(args, cache=None):
+    """Solve the CVRP problem.
+
+    Builds the model described by args, or takes it from cache, and
+    solves it.  With --fallback_strategies the model is built for the
+    first strategy of the chain that finds a first solution, see
+    first_solution.  Returns (data, manager, routing, assignment);
+    assignment is None when the solver found no solution.
+    """
+    progress = None
+    if args.progress:
+        progress = open(args.progress, 'w')
+    callback_stats = {} if args.profile else None
+    initial_assignment = None
+    if args.fallback_strategies and not args.warm_start:
+        (data, manager, routing, search_parameters, hooks,
+         initial_assignment) = first_solution(args, cache, progress, callback_stats)
+    else:
+        data, manager, routing, search_parameters, hooks = build_model(
+            args, cache, progress, callback_stats)
+    partial_start = False
+    if args.warm_start:
+        routing.CloseModelWithParameters(search_parameters)
+        routes = disjunctions.load_routes(args.warm_start, data, routing.vehicles())
+        initial_assignment = disjunctions.read_assignment(manager, routing, routes)
+        if initial_assignment is None:
+            # e.g. new mandatory nodes: keep the routes and fill them in
+            exclusive = any(getattr(args, name) for name in disjunctions.pair_exclusions)
+            initial_assignment = disjunctions.read_assignment(
+                manager, routing,
+                disjunctions.insert_missing_nodes(data, routes, exclusive))
+        if initial_assignment is None:
+            print('routes in', args.warm_start,
+                  'are not a feasible start, starting from them as far as they go')
+            initial_assignment = disjunctions.partial_assignment(
+                manager, routing, routes)
+            partial_start = True
+    # Solve the problem.
+    if search_parameters is None:
+        # the fallback chain used up the time limit
+        run = lambda: initial_assignment
+    elif initial_assignment is not None:
+        run = partial(routing.SolveFromAssignmentWithParameters,
+                      initial_assignment, search_parameters)
+    else:
+        run = partial(routing.SolveWithParameters, search_parameters)
+    start = time.perf_counter()
+    if args.profile_file:
+        profiler = cProfile.Profile()
+        assignment = profiler.runcall(run)
+        profiler.dump_stats(args.profile_file)
+    else:
+        assignment = run()
+    if assignment is None and partial_start:
+        # what is left of the time limit; none set means no limit
+        limit = search_parameters.time_limit.ToNanoseconds() / 1e9
+        remaining = limit - (time.perf_counter() - start)
+        if not limit or remaining > 0:
+            print('the search could not complete the routes, solving from scratch')
+            if limit:
+                search_parameters.time_limit.FromNanoseconds(int(remaining * 1e9))
+            assignment = routing.SolveWithParameters(search_parameters)
+    if callback_stats is not None:
+        print_profile(callback_stats, routing, time.perf_counter() - start)
+    if progress is not None:
+        progress.close()
+    raise_hook_errors(hooks)
+    return data, manager, routing, assignment
+
+
+def raise_hook_errors(hooks):
+    """Raises the first exception an at-solution hook raised, which ended the search."""
+    if hooks.errors:
+        raise RuntimeError('at-solution hook failed: {!r}'.format(
+            hooks.errors[0])) from hooks.errors[0]
+
+
+def print_profile(callback_stats, routing, seconds):
+    """Prints where the solve time went: Python callbacks or the native search."""
+    solver = routing.solver()
+    print('solve took {:.3f} s, {} branches, {} failures'.format(
+        seconds, solver.Branches(), solver.Failures()))
+    callback_ns = 0
+    for name, (calls, ns) in sorted(callback_stats.items()):
+        print('  callback {}: {} calls, {:.3f} s, {:.0f} ns per call'.format(
+            name, calls, ns / 1e9, ns / calls if calls else 0))
+        callback_ns += ns
+    print('  {:.1f}% of the solve in Python callbacks, {:.1f}% in native search'.format(
+        100 * callback_ns / 1e9 / seconds, 100 - 100 * callback_ns / 1e9 / seconds))
+
+
+def vehicle_in_use(data, manager, routing, vehicle):
+    """Whether vehicle visits a demand node in the solution being reported.
+
+    A route through dummy nodes alone leaves the vehicle unused, as
+    unused_count has it in add_pair_symmetry_breaking.  Must be called
+    from an at-solution callback.
+    """
+    num_demand_nodes = len(data['demands'])
+    index = routing.NextVar(routing.Start(vehicle)).Value()
+    while not routing.IsEnd(index):
+        if manager.IndexToNode(index) < num_demand_nodes:
+            return True
+        index = routing.NextVar(index).Value()
+    return False
+
+
+def progress_record(data, manager, routing, start):
+    """Describes the solution the search just found, for the progress stream.
+
+    Must be called from an at-solution callback, while the next
+    variables are bound.
+    """
+    dropped = [node for node in range(1, len(data['demands']))
+               if routing.NextVar(manager.NodeToIndex(node)).Value()
+               == manager.NodeToIndex(node)]
+    used = [vehicle_in_use(data, manager, routing, v)
+            for v in range(0, routing.vehicles())]
+    # truck-trailer is first, truck single unit second
+    return {'elapsed_ms': round((time.monotonic() - start) * 1000, 1),
+            'objective': routing.CostVar().Max(),
+            'dropped_nodes': len(dropped),
+            'active_vehicles': [{'combo': used[2*pair], 'single': used[2*pair + 1]}
+                                for pair in range(0, len(used)//2)]}
+
+
+def report_progress(data, manager, routing, stream, state):
+    """At-solution callback writing one JSON line per improving solution."""
+    objective = routing.CostVar().Max()
+    if state['best'] is not None and objective >= state['best']:
+        return
+    state['best'] = objective
+    stream.write(json.dumps(progress_record(data, manager, routing,
+                                            state['start'])) + '\n')
+    stream.flush()
+
+
+def stop_at_target(routing, target):
+    """At-solution callback ending the search once the objective reaches target."""
+    if routing.CostVar().Max() <= target:
+        routing.solver().FinishCurrentSearch()
+
+
+def stop_at_gap(routing, lower_bound, gap):
+    """At-solution callback ending the search within a relative gap of lower_bound."""
+    if routing.CostVar().Max() - lower_bound <= gap * abs(lower_bound):
+        routing.solver().FinishCurrentSearch()
+
+
+def stop_on_plateau(routing, seconds, state):
+    """At-solution callback ending the search once the objective stops improving.
+
+    The metaheuristics report every solution they move to, improving or
+    not, so the search is checked often even while it is stuck.  The
+    search ends at the first solution found more than seconds after the
+    last improvement.
+    """
+    objective = routing.CostVar().Max()
+    now = time.monotonic()
+    if state['best'] is None or objective < state['best']:
+        state['best'] = objective
+        state['since'] = now
+    elif now - state['since'] > seconds:
+        routing.solver().FinishCurrentSearch()
+
+
+def encoding_args(args, encoding):
+    """Returns a copy of args using one of disjunctions.encodings, and only that one."""
+    encoding_args = argparse.Namespace(**vars(args))
+    for options in disjunctions.encodings.values():
+        for name in options:
+            setattr(encoding_args, name, False)
+    for name, value in disjunctions.encodings[encoding].items():
+        setattr(encoding_args, name, value)
+    encoding_args.auto_encoding = False
+    return encoding_args
+
+
+def probe_encoding(job):
+    """Solves the sample with one encoding for args.probe_time seconds.
+
+    Returns (encoding, score, seconds to reach it), or (encoding, None,
+    None) when the probe found no solution.
+    """
+    args, encoding, sample = job
+    probe_args = encoding_args(args, encoding)
+    data = dict(sample)
+    manager, routing = disjunctions.build_routing_model(
+        data, **disjunctions.model_options(probe_args))
+    metaheuristic = 'GUIDED_LOCAL_SEARCH' if args.guided_local else args.metaheuristic
+    parameters = disjunctions.search_parameters(
+        args.probe_time, args.first_solution, metaheuristic)
+    trace = []
+    disjunctions.add_solution_hooks(routing).append(
+        partial(disjunctions.record_improvement, sample, manager, routing,
+                args.singlepenalty, trace, time.monotonic()))
+    routing.SolveWithParameters(parameters)
+    if not trace:
+        return encoding, None, None
+    return (encoding, trace[-1][1], trace[-1][0])
+
+
+def instance_signature(data, args):
+    """Describes the instance coarsely enough for similar ones to share probes.
+
+    Node counts are rounded to powers of two; fleet, costs, capacities
+    and penalties must match.
+    """
+    return 'nodes{}-pairs{}-combo{}x{}-single{}x{}-penalty{}-cardinality{}x{}'.format(
+        round(math.log2(len(data['demands']))),
+        len(data['vehicle_costs'])//2,
+        args.combo_capacity, args.combo_cost,
+        args.single_capacity, args.single_cost,
+        args.singlepenalty, args.cardinality, args.cardinality_penalty)
+
+
+def choose_encoding(args, data):
+    """Probes every encoding on a sample of data in parallel and picks one.
+
+    The lowest score wins, and among equal scores the one reached
+    soonest; the score is a cost, so it is not divided by the seconds,
+    which would favour the probes that took longest to get it.  Probe
+    results are kept in args.probe_file under the instance signature,
+    and a later run on a similar instance reuses them without probing.
+    Returns (encoding, seconds spent probing).
+    """
+    probes = {}
+    if args.probe_file and os.path.exists(args.probe_file):
+        with open(args.probe_file) as probe_file:
+            probes = json.load(probe_file)
+    signature = instance_signature(data, args)
+    if signature in probes:
+        print('reusing encoding probes for', signature)
+        return probes[signature]['encoding'], 0
+
+    start = time.monotonic()
+    sample = disjunctions.sample_instance(data, args.probe_nodes)
+    jobs = [(args, encoding, sample) for encoding in disjunctions.encodings]
+    with multiprocessing.Pool(min(len(jobs), os.cpu_count())) as pool:
+        results = pool.map(probe_encoding, jobs)
+    elapsed = time.monotonic() - start
+    for encoding, score, seconds in results:
+        print('encoding', encoding, 'probe score', score, 'after', seconds, 's')
+    solved = [(score, seconds, encoding)
+              for (encoding, score, seconds) in results if score is not None]
+    if not solved:
+        return None, elapsed
+    encoding = min(solved)[2]
+    probes[signature] = {
+        'encoding': encoding,
+        'probe_time': args.probe_time,
+        'probe_nodes': len(sample['demands']),
+        'probes': {encoding: {'score': score, 'seconds': seconds}
+                   for (encoding, score, seconds) in results},
+    }
+    if args.probe_file:
+        with open(args.probe_file, 'w') as probe_file:
+            json.dump(probes, probe_file, indent=1)
+    return encoding, elapsed
+
+
+def auto_solve(args):
+    """Solves with the encoding choose_encoding picks, in the time left over.
+
+    When no probe finds a solution the options in args are used as given.
+    """
+    encoding, elapsed = choose_encoding(args, create_data_model(args))
+    if encoding is None:
+        print('no encoding found a solution in the probe, solving as given')
+        return solve(args)
+    print('solving with encoding', encoding)
+    solve_args = encoding_args(args, encoding)
+    solve_args.timelimit = max(1, int(round(args.timelimit - elapsed)))
+    return solve(solve_args)
+
+
+@contextmanager
+def shared_instance(args):
+    """Yields a copy of args for worker processes that all map one copy of the instance.
+
+    An instance from --matrix_file is memory-mapped already and shared
+    as it is; any other is written to shared memory files first.
+    """
+    if args.matrix_file:
+        yield args
+        return
+    with disjunctions.shared_instance_files(create_data_model(args)) as (
+            matrix_file, demands_file):
+        shared_args = argparse.Namespace(**vars(args))
+        shared_args.matrix_file = matrix_file
+        shared_args.demands_file = demands_file
+        shared_args.distance_matrix = None
+        yield shared_args
+
+
+def portfolio_member_args(args, member):
+    """Returns a copy of args set up for one STRATEGY[/METAHEURISTIC] member."""
+    strategy, _, metaheuristic = member.partition('/')
+    member_args = argparse.Namespace(**vars(args))
+    member_args.first_solution = strategy
+    # the other members cover the other strategies
+    member_args.fallback_strategies = None
+    member_args.metaheuristic = metaheuristic or None
+    member_args.guided_local = False
+    member_args.portfolio = False
+    member_args.progress = None
+    return member_args
+
+
+def portfolio_worker(args, member, results):
+    """Solves one portfolio member and reports (member, objective, routes)."""
+    with redirect_stdout(io.StringIO()):
+        data, manager, routing, assignment = solve(
+            portfolio_member_args(args, member))
+    if assignment:
+        results.put((member, assignment.ObjectiveValue(),
+                     disjunctions.assignment_routes(manager, routing, assignment)))
+    else:
+        results.put((member, None, None))
+
+
+def portfolio_solve(args):
+    """Races every portfolio member in its own process and keeps the best.
+
+    All members share args.timelimit.  When args.target_objective is set
+    the race ends as soon as one member reaches it and the others are
+    stopped.  The winning routes are loaded back into a model built here
+    with the winner's options, so the return value matches solve().
+    """
+    members = args.portfolio_members.split(',')
+    results = multiprocessing.Queue()
+    # the shared files stay until every member is done with them
+    with shared_instance(args) as member_base:
+        workers = [multiprocessing.Process(target=portfolio_worker,
+                                           args=(member_base, member, results))
+                   for member in members]
+        for worker in workers:
+            worker.start()
+
+        # leave the members some room past the search limit to build and report
+        deadline = time.monotonic() + args.timelimit + 10
+        best = None
+        for _ in members:
+            try:
+                member, objective, routes = results.get(
+                    timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            print('portfolio member', member, 'objective', objective)
+            if objective is not None and (best is None or objective < best[1]):
+                best = (member, objective, routes)
+            if (best is not None and args.target_objective is not None
+                    and best[1] <= args.target_objective):
+                break
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+    if best is None:
+        data, manager, routing, search_parameters, hooks = build_model(args)
+        return data, manager, routing, None
+    member, objective, routes = best
+    print('best portfolio member is', member)
+    data, manager, routing, search_parameters, hooks = build_model(
+        portfolio_member_args(args, member))
+    routing.CloseModelWithParameters(search_parameters)
+    assignment = disjunctions.read_assignment(manager, routing, routes)
+    return data, manager, routing, assignment
+
+
+def cluster_args(args, sub):
+    """Returns a copy of args solving the cluster instance sub, inline."""
+    sub_args = argparse.Namespace(**vars(args))
+    sub_args.distance_matrix = sub['distance_matrix']
+    sub_args.demands = sub['demands']
+    sub_args.vehicles = len(sub['vehicle_costs']) // 2
+    sub_args.decompose = 0
+    sub_args.save_instance = None
+    sub_args.warm_start = None
+    sub_args.progress = None
+    sub_args.profile = False
+    sub_args.profile_file = None
+    return sub_args
+
+
+def cluster_worker(job):
+    """Solves one cluster; returns its routes, or None without a solution."""
+    args, sub = job
+    with redirect_stdout(io.StringIO()):
+        data, manager, routing, assignment = solve(cluster_args(args, sub))
+    if not assignment:
+        return None
+    return disjunctions.assignment_routes(manager, routing, assignment)
+
+
+def decompose_solve(args):
+    """Solves args.decompose clusters of the instance in parallel and stitches them.
+
+    Demand nodes are clustered by k-medoids on the distance matrix and
+    the vehicle pairs shared out by cluster demand, at least one each,
+    so there are no more clusters than pairs.  Every cluster is solved
+    with args.timelimit in its own process.  The stitched routes are
+    loaded into a model of the whole instance and, with
+    args.improve_time, improved there for that many seconds.  Returns
+    the same as solve().
+    """
+    data = create_data_model(args)
+    clusters = disjunctions.decompose_instance(data, args.decompose)
+    jobs = [(args, sub) for (_, _, sub) in clusters]
+    print('solving', len(jobs), 'clusters of',
+          [len(members) for (members, _, _) in clusters], 'nodes with',
+          [len(sub['vehicle_costs']) // 2 for (_, _, sub) in clusters],
+          'vehicle pairs')
+    start = time.monotonic()
+    with multiprocessing.Pool(min(len(jobs), os.cpu_count())) as pool:
+        cluster_routes = pool.map(cluster_worker, jobs)
+    print('clusters solved in', round(time.monotonic() - start, 3), 's,',
+          sum(routes is None for routes in cluster_routes), 'without a solution')
+    routes = disjunctions.stitch_routes(clusters, cluster_routes,
+                                        len(data['vehicle_costs']),
+                                        len(data['demands']))
+
+    improve_args = argparse.Namespace(**vars(args))
+    # a zero time limit would also stop loading the routes
+    improve_args.timelimit = args.improve_time or None
+    data, manager, routing, search_parameters, hooks = build_model(improve_args)
+    routing.CloseModelWithParameters(search_parameters)
+    assignment = disjunctions.read_assignment(manager, routing, routes)
+    if assignment is None:
+        print('stitched routes are not feasible for the whole model')
+    elif args.improve_time > 0:
+        print('stitched objective', assignment.ObjectiveValue())
+        improved = routing.SolveFromAssignmentWithParameters(
+            assignment, search_parameters)
+        raise_hook_errors(hooks)
+        if improved:
+            assignment = improved
+    return data, manager, routing, assignment
 
-    if args.log_search:
-        search_parameters.log_search = pywrapcp.BOOL_TRUE
 
-    # Solve the problem.
-    assignment = routing.SolveWithParameters(search_parameters)
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.decompose > 0 and args.cardinality_disjunction:
+        parser.error('the max cardinality disjunction spans every node, it can not be decomposed')
+    if args.fallback_strategies:
+        unknown = [strategy for strategy in args.fallback_strategies.split(',')
+                   if strategy not in first_solution_strategies]
+        if unknown:
+            parser.error('unknown first solution strategies: {}'.format(','.join(unknown)))
+    reasons = precheck(args)
+    if reasons:
+        for reason in reasons:
+            print('infeasible:', reason)
+        print('no assignment')
+        return
+    if args.portfolio:
+        data, manager, routing, assignment = portfolio_solve(args)
+    elif args.auto_encoding:
+        data, manager, routing, assignment = auto_solve(args)
+    elif args.decompose > 0:
+        data, manager, routing, assignment = decompose_solve(args)
+    else:
+        data, manager, routing, assignment = solve(args)
+    num_veh = len(data['vehicle_costs'])
+    cost_dimension = routing.GetDimensionOrDie("Cost")
 
     # Print solution on console.
     if assignment:
+        if args.save_routes:
+            disjunctions.save_routes(
+                args.save_routes, data,
+                disjunctions.assignment_routes(manager, routing, assignment))
         print('The Objective Value is {0}'.format(assignment.ObjectiveValue()))
         # examine the xor constraint stuff
 
@@ -381,7 +871,10 @@ def main():
             print('Truck',veh_pair,
                   'travel time\n     combo:',end_time_combo,
                   '\n     single:',end_time_single)
-        print_solution(data, manager, routing, assignment)
+        solution = disjunctions.extract_solution(data, manager, routing, assignment)
+        if args.solution_output:
+            disjunctions.write_solution(solution, args.solution_output)
+        print(disjunctions.format_solution(solution))
     else:
         print('no assignment')
 
@@ -0,0 +1,79 @@
+"""Shared model construction for the disjunction experiments.
+
+The scripts at the top of the repo reproduce one behaviour each; this
+package holds what they have in common: instance data, transit
+evaluators, the routing model builder and solution extraction.
+
+The names below are loaded from their submodules on first use, so
+importing the package costs nothing until a script gets past its
+argument parsing.  ortools comes in with the model and cache
+submodules, NumPy with any of them.
+"""
+import importlib
+
+
+# exported name: submodule defining it
+exports = {
+    'augment_distance_matrix': 'instance',
+    'vehicle_dummy_nodes': 'instance',
+    'vehicle_pair_dummy_nodes': 'instance',
+    'nearest_neighbors': 'instance',
+    'sample_instance': 'instance',
+    'load_array': 'instance',
+    'load_instance': 'instance',
+    'save_instance': 'instance',
+    'shared_instance_files': 'instance',
+    'synthetic_data_model': 'instance',
+    'CompactMatrix': 'matrix',
+    'distance_callback': 'transits',
+    'vehicle_distance_callback': 'transits',
+    'demand_callback': 'transits',
+    'vehicle_cost_classes': 'transits',
+    'register_callback_transits': 'transits',
+    'register_table_transits': 'transits',
+    'register_matrix_transits': 'transits',
+    'pair_exclusions': 'checks',
+    'infeasibility_reasons': 'checks',
+    'model_defaults': 'model',
+    'model_options': 'model',
+    'encodings': 'model',
+    'cardinality_penalty': 'model',
+    'restrict_to_neighbors': 'model',
+    'interchangeable_pairs': 'model',
+    'build_routing_model': 'model',
+    'search_parameters': 'model',
+    'instance_fingerprint': 'cache',
+    'add_solution_hooks': 'cache',
+    'ModelCache': 'cache',
+    'cluster_nodes': 'decompose',
+    'allocate_pairs': 'decompose',
+    'cluster_instance': 'decompose',
+    'decompose_instance': 'decompose',
+    'stitch_routes': 'decompose',
+    'dropped_nodes': 'solution',
+    'solution_score': 'solution',
+    'record_improvement': 'solution',
+    'extract_solution': 'solution',
+    'format_solution': 'solution',
+    'print_solution': 'solution',
+    'write_solution': 'solution',
+    'assignment_routes': 'solution',
+    'read_assignment': 'solution',
+    'insert_missing_nodes': 'solution',
+    'partial_assignment': 'solution',
+    'save_routes': 'solution',
+    'load_routes': 'solution',
+}
+
+__all__ = list(exports)
+
+def __getattr__(name):
+    """Imports an exported name from its submodule on first access."""
+    if name not in exports:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(exports))
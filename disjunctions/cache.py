@@ -0,0 +1,150 @@
+"""Reusing built routing models across solves of the same instance.
+
+Building the model (index manager, transit registration, dimensions,
+constraints) is repeated work when one depot and fleet is solved over
+and over with only the search limits changing.  ModelCache keeps
+prepared models keyed by a fingerprint of everything that goes into
+them.
+
+A model remembers the first solution strategy and metaheuristic it was
+first solved with, so those belong in the key too; time and solution
+limits may change freely between solves.  At-solution callbacks can
+not be removed from a model, so they go through the hook list from
+add_solution_hooks instead, which each solve refills.
+"""
+from collections import OrderedDict
+from functools import partial
+import hashlib
+import numpy as np
+
+from .matrix import CompactMatrix
+from .model import build_routing_model
+from .model import model_defaults
+
+
+def update_digest(digest, values, dtype, chunk=1 << 20):
+    """Feeds the values of an array to digest as dtype, chunk values at a time.
+
+    A chunk of a contiguous array of dtype is hashed in place, and any
+    other array is converted one chunk at a time, so the array is never
+    copied whole.
+    """
+    values = values.reshape(-1)
+    for first in range(0, len(values), chunk):
+        digest.update(memoryview(np.ascontiguousarray(
+            values[first:first + chunk], dtype=dtype)))
+
+
+def instance_fingerprint(data, options, search_key=()):
+    """Returns a hex digest of the instance, the model options and search_key.
+
+    A CompactMatrix is hashed by its stored values, without expanding
+    it, so it digests differently from the same matrix held dense.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ('distance_matrix', 'demands', 'vehicle_capacities', 'vehicle_costs'):
+        values = data[name]
+        dtype = np.int64
+        if isinstance(values, CompactMatrix):
+            # the repr names the dtype the values are hashed in
+            digest.update(repr(values).encode())
+            values = values.values
+            dtype = values.dtype
+        values = np.asarray(values)
+        digest.update(name.encode())
+        digest.update(repr(values.shape).encode())
+        update_digest(digest, values, dtype)
+    digest.update(repr(data['depot']).encode())
+    options = dict(model_defaults, **options)
+    digest.update(repr(sorted(options.items())).encode())
+    digest.update(repr(tuple(search_key)).encode())
+    return digest.hexdigest()
+
+
+class SolutionHooks(list):
+    """The hook list of add_solution_hooks.
+
+    errors holds what the hooks raised; the solver swallows exceptions
+    from at-solution callbacks, so whoever runs the search checks it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.errors = []
+
+    def clear(self):
+        """Removes every hook and error, for the next solve."""
+        del self[:]
+        del self.errors[:]
+
+
+def run_solution_hooks(solver, hooks):
+    """At-solution callback calling every hook currently in hooks.
+
+    A hook that raises ends the search, with its exception kept in
+    hooks.errors.
+    """
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as error:
+            hooks.errors.append(error)
+            solver.FinishCurrentSearch()
+            return
+
+def add_solution_hooks(routing):
+    """Registers a single at-solution callback and returns the SolutionHooks it runs."""
+    hooks = SolutionHooks()
+    routing.AddAtSolutionCallback(partial(run_solution_hooks, routing.solver(), hooks))
+    return hooks
+
+
+class ModelCache:
+    """Prepared models by instance fingerprint, at most maxsize of them.
+
+    policy is 'lru' to evict the least recently used model or 'fifo' to
+    evict the oldest one.  hits, misses and evictions count what the
+    cache has done so far.
+    """
+
+    policies = ('lru', 'fifo')
+
+    def __init__(self, maxsize=8, policy='lru'):
+        if policy not in self.policies:
+            raise ValueError('unknown eviction policy: {}'.format(policy))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, data, options, search_key=()):
+        """Returns (data, manager, routing, hooks) for data built with options.
+
+        On a miss the model is built with build_routing_model, which may
+        append dummy nodes to data; on a hit the data the model was built
+        from is returned in place of the argument.  hooks is the model's
+        at-solution hook list, emptied for the caller to fill.
+        """
+        key = instance_fingerprint(data, options, search_key)
+        entry = self.models.get(key)
+        if entry is not None:
+            self.hits += 1
+            if self.policy == 'lru':
+                self.models.move_to_end(key)
+        else:
+            self.misses += 1
+            manager, routing = build_routing_model(data, **options)
+            entry = (data, manager, routing, add_solution_hooks(routing))
+            self.models[key] = entry
+            while len(self.models) > max(self.maxsize, 0):
+                self.models.popitem(last=False)
+                self.evictions += 1
+        entry[3].clear()
+        return entry
+
+    def stats(self):
+        """Returns the hit, miss and eviction counts and the current size."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.models)}
@@ -0,0 +1,87 @@
+"""Spotting instances the routing model can have no solution for.
+
+The solver answers an impossible configuration with "no assignment",
+but only once its time limit runs out.  infeasibility_reasons looks at
+the instance and the model options alone and names what rules every
+solution out, in milliseconds and without ortools: demand beyond what
+the fleet can carry when only one vehicle of a pair may run, nodes no
+vehicle can hold, and travel costs beyond the 'Cost' dimension, each
+when no disjunction lets the nodes be dropped.  The checks are
+necessary conditions only; an instance passing them may still have no
+solution.
+"""
+import numpy as np
+
+from .matrix import as_array
+
+
+# capacity of the 'Cost' dimension of build_routing_model
+cost_capacity = 300000
+
+# model options keeping both vehicles of a pair from running
+pair_exclusions = ('cumulative_constraint', 'count_constraint',
+                   'vehicle_used_constraint', 'fake_nodes_constraints')
+
+
+def fleet_capacity(data, exclusive):
+    """Returns the most the fleet can carry; one vehicle per pair when exclusive."""
+    capacities = np.asarray(data['vehicle_capacities'], dtype=np.int64)
+    if not exclusive:
+        return int(capacities.sum())
+    pairs = capacities[:len(capacities)//2*2].reshape(-1, 2)
+    return int(pairs.max(axis=1).sum()) + int(capacities[len(pairs)*2:].sum())
+
+
+def cheapest_arrivals(matrix, num_demand_nodes, chunk=1024):
+    """Returns the cheapest arc into every demand node from another demand node."""
+    matrix = as_array(matrix)
+    nodes = np.arange(1, num_demand_nodes)
+    cheapest = np.empty(len(nodes), dtype=np.int64)
+    for first in range(0, len(nodes), chunk):
+        targets = nodes[first:first + chunk]
+        arcs = np.array(matrix[nodes[:, None], targets[None, :]], dtype=np.int64)
+        # no arc from a node to itself
+        arcs[targets - 1, np.arange(len(targets))] = np.iinfo(np.int64).max
+        cheapest[first:first + len(targets)] = arcs.min(axis=0)
+    return cheapest
+
+
+def infeasibility_reasons(data, **options):
+    """Returns why the model options make data infeasible, [] when no reason is found.
+
+    options are build_routing_model's.  Call it before any dummy nodes
+    are added.
+    """
+    demands = np.asarray(data['demands'], dtype=np.int64)
+    num_demand_nodes = len(demands)
+    if num_demand_nodes <= 1:
+        return []
+    if options.get('single_disjunctions') or options.get('cardinality_disjunction'):
+        # any node may be dropped, at a penalty
+        return []
+    reasons = []
+    capacities = np.asarray(data['vehicle_capacities'], dtype=np.int64)
+    largest = int(capacities.max()) if len(capacities) else 0
+    too_big = np.flatnonzero(demands[1:] > largest) + 1
+    if len(too_big):
+        reasons.append('{} nodes, e.g. node {} with demand {}, need more than the largest vehicle capacity {}'.format(
+            len(too_big), too_big[0], demands[too_big[0]], largest))
+    exclusive = any(options.get(name) for name in pair_exclusions)
+    capacity = fleet_capacity(data, exclusive)
+    total = int(demands[1:].sum())
+    if total > capacity:
+        reasons.append('total demand {} exceeds the fleet capacity {}{}'.format(
+            total, capacity,
+            ' with one vehicle per pair' if exclusive else ''))
+    costs = np.asarray(data['vehicle_costs'], dtype=np.int64)
+    if 0 < len(costs) < num_demand_nodes - 1:
+        # each route's first node may come from the depot or a dummy node,
+        # for any cost; every other node is entered from a demand node
+        arrivals = np.sort(cheapest_arrivals(data['distance_matrix'], num_demand_nodes))
+        least_cost = int(arrivals[:-len(costs)].sum()) * int(costs.min())
+        if least_cost > cost_capacity * len(costs):
+            reasons.append('visiting every node costs at least {}, more than {} vehicles accrue at {} each'.format(
+                least_cost, len(costs), cost_capacity))
+    if reasons:
+        reasons.append('no disjunction lets a node be dropped')
+    return reasons
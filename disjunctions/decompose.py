@@ -0,0 +1,135 @@
+"""Cluster-first, route-second decomposition of large instances.
+
+cluster_nodes splits the demand nodes into clusters straight from the
+distance matrix, allocate_pairs shares the vehicle pairs out among
+them and cluster_instance cuts out the instance each cluster is solved
+on; decompose_instance does all three.  stitch_routes maps the
+clusters' routes back onto the whole instance and fleet.  The depot
+must be node 0 and the fleet a repeat of one vehicle pair, as
+everywhere else in these scripts.
+"""
+import numpy as np
+
+from .matrix import as_array
+
+
+def medoid_distances(matrix, nodes, medoids):
+    """Returns the round trip distance from every node to every medoid, nodes by medoids."""
+    medoids = np.asarray(medoids)
+    return (np.asarray(matrix[nodes[:, None], medoids[None, :]], dtype=np.int64)
+            + np.asarray(matrix[medoids[:, None], nodes[None, :]], dtype=np.int64).T)
+
+def cluster_medoid(matrix, members, chunk=1024):
+    """Returns the member with the least round trip distance to the rest of members."""
+    totals = np.empty(len(members), dtype=np.int64)
+    for first in range(0, len(members), chunk):
+        rows = members[first:first + chunk]
+        totals[first:first + len(rows)] = (
+            np.asarray(matrix[rows[:, None], members[None, :]], dtype=np.int64).sum(axis=1)
+            + np.asarray(matrix[members[:, None], rows[None, :]], dtype=np.int64).sum(axis=0))
+    return int(members[np.argmin(totals)])
+
+def cluster_nodes(matrix, num_demand_nodes, k, seed=0, iterations=20, chunk=1024):
+    """Returns the cluster, 0 to k - 1, of every demand node by k-medoids.
+
+    Entry i belongs to demand node i + 1.  Distances are round trips,
+    so an asymmetric matrix is fine.  The medoids start farthest first
+    from a random node and then alternate between assigning every node
+    to its nearest medoid and moving each medoid to the member nearest
+    the rest of its cluster, until they settle or iterations run out.
+    Only node to medoid entries and one cluster's block, chunk rows at
+    a time, are read, so a memory-mapped matrix is never copied whole.
+    """
+    matrix = as_array(matrix)
+    nodes = np.arange(1, num_demand_nodes)
+    k = max(1, min(k, len(nodes)))
+    rng = np.random.default_rng(seed)
+    medoids = [int(rng.choice(nodes))]
+    nearest = medoid_distances(matrix, nodes, medoids)[:, 0]
+    while len(medoids) < k:
+        medoids.append(int(nodes[np.argmax(nearest)]))
+        nearest = np.minimum(nearest,
+                             medoid_distances(matrix, nodes, medoids[-1:])[:, 0])
+    for _ in range(iterations):
+        labels = np.argmin(medoid_distances(matrix, nodes, medoids), axis=1)
+        moved = [cluster_medoid(matrix, nodes[labels == c], chunk)
+                 if np.any(labels == c) else medoids[c]
+                 for c in range(0, k)]
+        if moved == medoids:
+            break
+        medoids = moved
+    return np.argmin(medoid_distances(matrix, nodes, medoids), axis=1)
+
+
+def allocate_pairs(loads, num_pairs):
+    """Shares num_pairs vehicle pairs out in proportion to loads.
+
+    Every cluster gets at least one pair, so num_pairs must be at least
+    len(loads); the rest go by largest remainder.
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    spare = num_pairs - len(loads)
+    if loads.sum() > 0:
+        share = loads / loads.sum() * spare
+    else:
+        share = np.full(len(loads), spare / len(loads))
+    pairs = np.floor(share).astype(np.int64)
+    order = np.argsort(pairs - share, kind='stable')
+    pairs[order[:spare - pairs.sum()]] += 1
+    return (pairs + 1).tolist()
+
+
+def cluster_instance(data, members, first_pair, pairs):
+    """Returns the instance of the depot and members, served by pairs pairs from first_pair on."""
+    nodes = np.concatenate(([0], members))
+    sub = dict(data)
+    sub['distance_matrix'] = as_array(data['distance_matrix'])[np.ix_(nodes, nodes)]
+    sub['demands'] = np.asarray(data['demands'])[nodes]
+    vehicles = slice(2*first_pair, 2*(first_pair + pairs))
+    sub['vehicle_capacities'] = list(data['vehicle_capacities'][vehicles])
+    sub['vehicle_costs'] = list(data['vehicle_costs'][vehicles])
+    return sub
+
+
+def decompose_instance(data, k, seed=0):
+    """Splits data into at most k cluster instances, one vehicle pair or more each.
+
+    Returns a list of (members, first_pair, instance) per cluster:
+    members are the cluster's demand node ids, in the order of the
+    instance's nodes 1 on, and first_pair is the first of its pairs in
+    the whole fleet.
+    """
+    num_pairs = len(data['vehicle_costs']) // 2
+    labels = cluster_nodes(data['distance_matrix'], len(data['demands']),
+                           min(k, num_pairs), seed)
+    members = [np.flatnonzero(labels == c) + 1 for c in range(0, labels.max() + 1)]
+    members = [cluster for cluster in members if len(cluster)]
+    demands = np.asarray(data['demands'])
+    pairs = allocate_pairs([demands[cluster].sum() for cluster in members],
+                           num_pairs)
+    first_pairs = np.cumsum([0] + pairs[:-1]).tolist()
+    return [(cluster, first, cluster_instance(data, cluster, first, count))
+            for (cluster, first, count) in zip(members, first_pairs, pairs)]
+
+
+def stitch_routes(clusters, cluster_routes, num_veh, num_demand_nodes):
+    """Maps per-cluster routes onto the whole instance's nodes and vehicles.
+
+    clusters is as from decompose_instance and cluster_routes holds each
+    cluster's routes as from assignment_routes, or None for a cluster
+    without a solution, whose nodes are then left out.  The dummy nodes
+    of a cluster model's pairs become those of the same pairs in the
+    whole instance, which has num_demand_nodes demand nodes.  Returns
+    num_veh routes of original node ids.
+    """
+    routes = [[] for _ in range(0, num_veh)]
+    for (members, first_pair, _), sub_routes in zip(clusters, cluster_routes):
+        if sub_routes is None:
+            continue
+        nodes = np.concatenate(([0], members))
+        dummy_shift = num_demand_nodes + 2*first_pair - len(nodes)
+        for vehicle, route in enumerate(sub_routes):
+            routes[2*first_pair + vehicle] = [
+                int(nodes[node]) if node < len(nodes) else node + dummy_shift
+                for node in route]
+    return routes
@@ -0,0 +1,219 @@
+"""Instance data: distance matrices, demands and the vehicle fleet.
+
+An instance is the plain dict the scripts have always passed around,
+with 'distance_matrix', 'demands', 'vehicle_capacities', 'vehicle_costs'
+and 'depot' entries.  Vehicles come in pairs, truck-trailer combo first
+and truck single unit second.
+"""
+from contextlib import contextmanager
+from itertools import chain
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from .matrix import CompactMatrix
+from .matrix import as_array
+
+def augment_distance_matrix(matrix, num_demand_nodes, num_new):
+    """Returns matrix grown by num_new dummy nodes in a single allocation.
+
+    The costs match what vehicle_dummy_nodes has always produced: the
+    depot reaches every regular node for 1 and every dummy node for 0, a
+    dummy node returns to the depot for 0 and reaches regular nodes for
+    3, and every other trip into or out of a dummy node costs 10000.
+    A CompactMatrix gets the dummy nodes without copying its values.
+    """
+    if isinstance(matrix, CompactMatrix):
+        return matrix.with_dummy_nodes(num_demand_nodes, num_new)
+    matrix = np.asarray(matrix)
+    size = len(matrix)
+    regular_nodes = slice(1, num_demand_nodes)
+    augmented = np.full((size + num_new, size + num_new), 10000, dtype=np.int64)
+    augmented[:size, :size] = matrix
+    augmented[0, regular_nodes] = 1
+    augmented[0, size:] = 0   # free to get from depot to dummy node
+    augmented[size:, 0] = 0   # free to get from new node back to depot
+    augmented[size:, regular_nodes] = 3 # just like regular depot to node cost
+    return augmented
+
+def vehicle_dummy_nodes(data):
+    """slot in a dummy node for this vehicle.  Must go to dummy node from depot"""
+    new_node = len(data['distance_matrix'])
+    data['distance_matrix'] = augment_distance_matrix(
+        data['distance_matrix'], len(data['demands']), 1)
+    return new_node
+
+def vehicle_pair_dummy_nodes(data, num_pairs):
+    """slot in a combo and a single dummy node for each vehicle pair at once.
+
+    Same result as calling vehicle_dummy_nodes twice per pair, but the
+    augmented matrix is built with one allocation.  Returns the new node
+    ids; pair k owns nodes 2*k and 2*k + 1 of the returned range.
+    """
+    first_node = len(data['distance_matrix'])
+    data['distance_matrix'] = augment_distance_matrix(
+        data['distance_matrix'], len(data['demands']), 2*num_pairs)
+    return range(first_node, first_node + 2*num_pairs)
+
+
+def nearest_neighbors(matrix, num_demand_nodes, k, chunk=1024):
+    """Returns the k nearest demand nodes of every demand node.
+
+    Row i of the result holds the ids of the k demand nodes closest to
+    demand node i + 1 by outgoing distance, in no particular order; the
+    depot and any dummy nodes are not candidates.  Rows are handled
+    chunk at a time with argpartition, so a memory-mapped matrix is
+    never copied whole.
+    """
+    matrix = as_array(matrix)
+    regular_nodes = np.arange(1, num_demand_nodes)
+    k = min(k, len(regular_nodes) - 1)
+    neighbors = np.empty((len(regular_nodes), max(k, 0)), dtype=np.int64)
+    if k <= 0:
+        return neighbors
+    for first in range(0, len(regular_nodes), chunk):
+        rows = regular_nodes[first:first + chunk]
+        distances = np.array(matrix[rows[0]:rows[-1] + 1, 1:num_demand_nodes],
+                             dtype=np.float64)
+        # a node is not its own neighbour
+        distances[np.arange(len(rows)), rows - 1] = np.inf
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        neighbors[first:first + len(rows)] = nearest + 1
+    return neighbors
+
+
+def sample_instance(data, num_nodes, seed=0):
+    """Returns a smaller instance of the depot and num_nodes - 1 random demand nodes.
+
+    The fleet shrinks in proportion, keeping at least one vehicle pair.
+    An instance no bigger than num_nodes is returned whole.  The depot
+    must be node 0, as everywhere else in these scripts.
+    """
+    total = len(data['demands'])
+    if num_nodes >= total:
+        return dict(data)
+    rng = np.random.default_rng(seed)
+    nodes = np.concatenate(([0], np.sort(rng.choice(
+        np.arange(1, total), num_nodes - 1, replace=False))))
+    pairs = len(data['vehicle_costs']) // 2
+    pairs = max(1, int(round(pairs * (num_nodes - 1) / (total - 1))))
+    sample = dict(data)
+    sample['distance_matrix'] = as_array(data['distance_matrix'])[np.ix_(nodes, nodes)]
+    sample['demands'] = np.asarray(data['demands'])[nodes]
+    sample['vehicle_capacities'] = list(data['vehicle_capacities'][:2*pairs])
+    sample['vehicle_costs'] = list(data['vehicle_costs'][:2*pairs])
+    return sample
+
+
+def load_npy(path):
+    """Maps a .npy array into memory without reading it."""
+    return np.load(path, mmap_mode='r')
+
+def load_raw_int64(path):
+    """Maps a headerless little-endian int64 file into memory as a vector."""
+    return np.memmap(path, dtype='<i8', mode='r')
+
+# loaders by file suffix; anything else is read as raw int64
+instance_loaders = {
+    '.npy': load_npy,
+}
+
+def load_array(path):
+    """Memory-maps path with the loader registered for its suffix."""
+    for suffix, loader in instance_loaders.items():
+        if path.endswith(suffix):
+            return loader(path)
+    return load_raw_int64(path)
+
+def load_instance(matrix_path, demands_path=None):
+    """Reads a distance matrix and demands from binary files.
+
+    Both arrays stay memory-mapped, so nothing is parsed into Python
+    lists and only the pages the solver touches are read.  Without a
+    demands file every node but the depot gets a demand of 1, as in the
+    literal instances.
+    """
+    matrix = load_array(matrix_path)
+    if matrix.ndim == 1:
+        # a raw file has no shape of its own
+        side = int(round(np.sqrt(len(matrix))))
+        if side * side == len(matrix):
+            matrix = matrix.reshape(side, side)
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError('distance matrix in {} is not square: {}'.format(
+            matrix_path, matrix.shape))
+    if demands_path is None:
+        demands = np.ones(len(matrix), dtype=np.int64)
+        demands[0] = 0
+    else:
+        demands = load_array(demands_path)
+        if demands.ndim != 1 or len(demands) != len(matrix):
+            raise ValueError('expected {} demands in {}, got shape {}'.format(
+                len(matrix), demands_path, demands.shape))
+    return matrix, demands
+
+def save_instance(data, prefix):
+    """Writes the matrix and demands to <prefix>_matrix.npy and <prefix>_demands.npy."""
+    np.save(prefix + '_matrix.npy', np.asarray(data['distance_matrix'], dtype=np.int64))
+    np.save(prefix + '_demands.npy', np.asarray(data['demands'], dtype=np.int64))
+
+
+@contextmanager
+def shared_instance_files(data):
+    """Writes the matrix and demands of data for worker processes to map.
+
+    Yields the (matrix, demands) paths of .npy files in a fresh
+    directory, under /dev/shm where there is one so nothing goes to
+    disk.  Every process reading them with load_instance maps the same
+    pages instead of holding its own copy of the matrix.  The directory
+    is removed on exit.
+    """
+    shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    directory = tempfile.mkdtemp(prefix='disjunctions-', dir=shm)
+    try:
+        prefix = os.path.join(directory, 'instance')
+        save_instance(data, prefix)
+        del data
+        yield prefix + '_matrix.npy', prefix + '_demands.npy'
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def synthetic_data_model(num_nodes, vehicles, seed=0,
+                         combo_capacity=None, single_capacity=None,
+                         combo_cost=5, single_cost=1, as_lists=True):
+    """Random Euclidean instance with the same layout as create_data_model.
+
+    The matrix is computed a block of rows at a time, so large instances
+    only ever hold the int64 matrix itself.  With as_lists False the
+    matrix and demands are left as NumPy arrays instead of nested lists.
+    """
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 1000, size=(num_nodes, 2))
+    matrix = np.empty((num_nodes, num_nodes), dtype=np.int64)
+    for first in range(0, num_nodes, 1024):
+        delta = points[first:first + 1024, None, :] - points[None, :, :]
+        matrix[first:first + 1024] = np.rint(np.sqrt((delta**2).sum(axis=2)))
+    demands = rng.integers(1, 4, size=num_nodes)
+    demands[0] = 0
+    if combo_capacity is None:
+        # enough room for every node when each pair runs as a combo
+        combo_capacity = int(np.ceil(demands.sum() / vehicles)) + 3
+    if single_capacity is None:
+        single_capacity = max(1, combo_capacity // 3)
+    data = {}
+    if as_lists:
+        data['distance_matrix'] = matrix.tolist()
+        data['demands'] = demands.tolist()
+    else:
+        data['distance_matrix'] = matrix
+        data['demands'] = demands
+    data['vehicle_capacities'] = list(
+        chain.from_iterable([combo_capacity, single_capacity]
+                            for _ in range(0, vehicles)))
+    data['vehicle_costs'] = list(
+        chain.from_iterable([combo_cost, single_cost]
+                            for _ in range(0, vehicles)))
+    data['depot'] = 0
+    return data
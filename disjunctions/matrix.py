@@ -0,0 +1,212 @@
+"""Compact storage of distance matrices.
+
+The instances are symmetric and their distances small, yet a matrix is
+held as full int64 rows or nested lists of Python ints.  CompactMatrix
+keeps only the upper triangle of a symmetric matrix, in the narrowest
+integer type its values fit, and represents the dummy nodes that
+vehicle_dummy_nodes appends by their fixed costs instead of rows of the
+10000 sentinel.  Arcs are still looked up in O(1), as matrix[i][j] or
+matrix.arc(i, j), and NumPy-style indexing with slices and index
+arrays returns dense blocks, so the rest of the package takes it in
+place of a matrix.
+"""
+import numpy as np
+
+
+# fixed costs into and out of dummy nodes, as in augment_distance_matrix
+DEPOT_TO_REGULAR = 1
+DEPOT_TO_DUMMY = 0
+DUMMY_TO_DEPOT = 0
+DUMMY_TO_REGULAR = 3
+DUMMY_SENTINEL = 10000
+
+
+def narrowest_dtype(low, high):
+    """Returns the smallest signed integer dtype holding every value from low to high."""
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise OverflowError('no integer dtype holds {} to {}'.format(low, high))
+
+def scan_matrix(matrix, chunk=1024):
+    """Returns (symmetric, lowest, highest) of a square matrix, chunk rows at a time."""
+    symmetric = True
+    low = high = 0
+    for first in range(0, len(matrix), chunk):
+        rows = np.asarray(matrix[first:first + chunk])
+        low = min(low, int(rows.min()))
+        high = max(high, int(rows.max()))
+        if symmetric:
+            symmetric = np.array_equal(rows, np.asarray(matrix[:, first:first + chunk]).T)
+    return symmetric, low, high
+
+
+def as_array(matrix):
+    """Returns matrix as a NumPy array, or unchanged if it is a CompactMatrix."""
+    if isinstance(matrix, CompactMatrix):
+        return matrix
+    return np.asarray(matrix)
+
+
+class CompactRow:
+    """Row i of a CompactMatrix, so matrix[i][j] stays an O(1) lookup."""
+
+    def __init__(self, matrix, row):
+        self.matrix = matrix
+        self.row = row
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.matrix.arc(self.row, int(key))
+        return self.matrix[self.row, key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.matrix[self.row, :], dtype=dtype)
+
+
+class CompactMatrix:
+    """A square distance matrix in compact form; build it with from_matrix.
+
+    values holds the upper triangle row by row when symmetric, else
+    every entry, in the narrowest dtype the stored distances fit.  The
+    first size nodes are stored; the num_dummy nodes after them are
+    dummy nodes whose costs are the fixed ones above, and with dummy
+    nodes the depot reaches the regular nodes, 1 to num_demand_nodes -
+    1, for DEPOT_TO_REGULAR.
+    """
+
+    def __init__(self, values, size, symmetric, num_demand_nodes=0, num_dummy=0):
+        self.values = values
+        self.size = size
+        self.symmetric = symmetric
+        self.num_demand_nodes = num_demand_nodes
+        self.num_dummy = num_dummy
+        # arc (i, j), i <= j when symmetric, is values[row_start[i] + j]
+        if symmetric:
+            self.row_start = [i * size - i * (i + 1) // 2 for i in range(0, size)]
+        else:
+            self.row_start = [i * size for i in range(0, size)]
+        # a memoryview yields plain ints, without going through NumPy scalars
+        self.table = memoryview(values)
+
+    @classmethod
+    def from_matrix(cls, matrix, chunk=1024):
+        """Packs a square matrix, nested lists or any array, a chunk of rows at a time."""
+        if not isinstance(matrix, np.ndarray):
+            matrix = np.asarray(matrix)
+        size = len(matrix)
+        symmetric, low, high = scan_matrix(matrix, chunk)
+        dtype = narrowest_dtype(low, high)
+        if not symmetric:
+            values = np.empty(size * size, dtype=dtype)
+            for first in range(0, size, chunk):
+                rows = np.asarray(matrix[first:first + chunk])
+                values[first * size:(first + len(rows)) * size] = rows.reshape(-1)
+            return cls(values, size, False)
+        values = np.empty(size * (size + 1) // 2, dtype=dtype)
+        start = 0
+        for i in range(0, size):
+            values[start:start + size - i] = matrix[i, i:]
+            start += size - i
+        return cls(values, size, True)
+
+    def with_dummy_nodes(self, num_demand_nodes, num_new):
+        """Returns the matrix grown by num_new dummy nodes, sharing the stored values."""
+        return CompactMatrix(self.values, self.size, self.symmetric,
+                             num_demand_nodes, self.num_dummy + num_new)
+
+    @property
+    def dtype(self):
+        """The dtype of dense blocks: the stored one, widened for the sentinel with dummy nodes."""
+        if self.num_dummy:
+            return np.promote_types(self.values.dtype, narrowest_dtype(0, DUMMY_SENTINEL))
+        return self.values.dtype
+
+    @property
+    def shape(self):
+        return (len(self), len(self))
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def __len__(self):
+        return self.size + self.num_dummy
+
+    def __repr__(self):
+        return 'CompactMatrix({0} nodes, {1} dummy, {2}, {3}, {4} bytes)'.format(
+            self.size, self.num_dummy,
+            'symmetric' if self.symmetric else 'asymmetric',
+            self.values.dtype, self.nbytes)
+
+    def arc(self, i, j):
+        """Returns the distance from node i to node j as a Python int."""
+        if self.num_dummy and (i == 0 or i >= self.size or j >= self.size):
+            return self.dummy_arc(i, j)
+        if self.symmetric and i > j:
+            i, j = j, i
+        return self.table[self.row_start[i] + j]
+
+    def dummy_arc(self, i, j):
+        """arc for the arcs out of the depot and into or out of dummy nodes."""
+        if i < self.size and j < self.size:
+            if 0 < j < self.num_demand_nodes:
+                return DEPOT_TO_REGULAR
+            return self.table[self.row_start[0] + j]
+        if i == 0:
+            return DEPOT_TO_DUMMY
+        if j == 0:
+            return DUMMY_TO_DEPOT
+        if i >= self.size and 0 < j < self.num_demand_nodes:
+            return DUMMY_TO_REGULAR
+        return DUMMY_SENTINEL
+
+    def take(self, rows, cols):
+        """Returns the distances from rows to cols, broadcast against each other."""
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.int64),
+                                         np.asarray(cols, dtype=np.int64))
+        if rows.size and max(rows.max(), cols.max()) >= len(self):
+            raise IndexError('node out of range for {} nodes'.format(len(self)))
+        stored = (rows < self.size) & (cols < self.size)
+        low = np.where(self.symmetric, np.minimum(rows, cols), rows)[stored]
+        high = np.where(self.symmetric, np.maximum(rows, cols), cols)[stored]
+        result = np.empty(rows.shape, dtype=self.dtype)
+        if self.symmetric:
+            result[stored] = self.values[low * self.size - low * (low + 1) // 2 + high]
+        else:
+            result[stored] = self.values[low * self.size + high]
+        if self.num_dummy:
+            result[~stored] = DUMMY_SENTINEL
+            regular = (cols > 0) & (cols < self.num_demand_nodes)
+            dummy_rows = rows >= self.size
+            result[(rows == 0) & regular] = DEPOT_TO_REGULAR
+            result[(rows == 0) & (cols >= self.size)] = DEPOT_TO_DUMMY
+            result[dummy_rows & (cols == 0)] = DUMMY_TO_DEPOT
+            result[dummy_rows & regular] = DUMMY_TO_REGULAR
+        return result
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            if isinstance(key, (int, np.integer)):
+                return CompactRow(self, int(key))
+            key = (key, slice(None))
+        rows, cols = key
+        if isinstance(rows, (int, np.integer)) and isinstance(cols, (int, np.integer)):
+            return self.arc(int(rows), int(cols))
+        if isinstance(rows, slice):
+            rows = np.arange(*rows.indices(len(self)))
+            if not isinstance(cols, slice):
+                rows = rows[:, None]
+        if isinstance(cols, slice):
+            cols = np.arange(*cols.indices(len(self)))
+            rows = np.asarray(rows)[..., None]
+        return self.take(rows, cols)
+
+    def __array__(self, dtype=None, copy=None):
+        """The whole dense matrix; built anew on every call."""
+        dense = self[:, :]
+        return dense if dtype is None else dense.astype(dtype, copy=False)
@@ -0,0 +1,334 @@
+"""Building the routing model for an instance.
+
+build_routing_model is the one construction path shared by the scripts,
+the sweep, the portfolio and the benchmarks.  The model options are
+keyword arguments named like the disjunction_fail.py command line dest
+names, so model_options(args) can pick them out of a parsed command
+line.
+"""
+from ortools.constraint_solver import pywrapcp
+from ortools.constraint_solver import routing_enums_pb2
+import numpy as np
+
+from .checks import cost_capacity
+from .instance import nearest_neighbors
+from .instance import vehicle_pair_dummy_nodes
+from .transits import register_callback_transits
+from .transits import register_matrix_transits
+from .transits import register_table_transits
+
+
+# keyword arguments of build_routing_model, with their defaults
+model_defaults = {
+    'matrix_transits': False,
+    'table_transits': False,
+    'fake_nodes': False,
+    'cumulative_constraint': False,
+    'count_constraint': False,
+    'vehicle_used_constraint': False,
+    'fake_nodes_constraints': False,
+    'single_disjunctions': False,
+    'singlepenalty': 1,
+    'cardinality_disjunction': False,
+    'cardinality': 2,
+    'cardinality_penalty': 0,
+    'neighbors': 0,
+    'symmetry_breaking': None,
+}
+
+def model_options(args):
+    """Returns the build_routing_model keyword arguments set on args."""
+    return {name: getattr(args, name) for name in model_defaults
+            if hasattr(args, name)}
+
+# build_routing_model options selecting each way of keeping both
+# vehicles of a pair from running; plain single node disjunctions let
+# both run, so they are only ever combined with a pair exclusion
+encodings = {
+    'cumulative': {'cumulative_constraint': True, 'single_disjunctions': True},
+    'count': {'count_constraint': True, 'single_disjunctions': True},
+    'vehicle_used': {'vehicle_used_constraint': True, 'single_disjunctions': True},
+    'fake_nodes': {'fake_nodes': True, 'fake_nodes_constraints': True,
+                   'single_disjunctions': True},
+    'cardinality': {'cardinality_disjunction': True, 'count_constraint': True},
+}
+
+
+def add_cumulative_exclusion(routing, combo, single):
+    """Keeps combo and single from both accruing travel cost."""
+    cost_dimension = routing.GetDimensionOrDie('Cost')
+    end_time_combo = cost_dimension.CumulVar(routing.End(combo))
+    end_time_single = cost_dimension.CumulVar(routing.End(single))
+
+    combo_on = end_time_combo > 0
+    single_on = end_time_single > 0
+
+    # constrain solver to prevent both being on
+    # truth table
+    #
+    # combo_on     single_on   multiply  descr
+    #   0             0           0      both unused; okay
+    #   1             0           0      combo on only; okay
+    #   0             1           0      single on only; okay
+    #   1             1           1      both on; prevent
+    #
+    routing.solver().Add(combo_on * single_on == 0)
+
+def add_count_exclusion(routing, combo, single):
+    """Keeps combo and single from both visiting a node, by their end counts."""
+    count_dimension = routing.GetDimensionOrDie('count')
+    combo_on = count_dimension.CumulVar(routing.End(combo)) > 1
+    single_on = count_dimension.CumulVar(routing.End(single)) > 1
+    routing.solver().Add(combo_on + single_on <= 1)
+
+def add_vehicle_used_exclusion(routing, combo, single):
+    """Keeps combo and single from both being used, by routing's own used indicators.
+
+    ActiveVehicleVar is 1 exactly when the vehicle leaves its start for
+    a node, so this is a linear constraint on two booleans the routing
+    model maintains anyway, instead of a product of derived booleans.
+    """
+    routing.solver().Add(
+        routing.ActiveVehicleVar(combo) + routing.ActiveVehicleVar(single) <= 1)
+
+def add_fake_node_constraints(data, manager, routing, veh_pair, combo, single):
+    """Ties the pair's dummy nodes to its vehicles and keeps both from being used."""
+    solver = routing.solver()
+    count_dimension = routing.GetDimensionOrDie('count')
+    newnode_1 = manager.NodeToIndex(len(data['demands']) + 2*veh_pair)
+    newnode_2 = manager.NodeToIndex(len(data['demands']) + 2*veh_pair + 1)
+
+    node1_on = routing.VehicleVar(newnode_1) > -1
+    node1_combo = routing.VehicleVar(newnode_1) == combo
+    node2_on = routing.VehicleVar(newnode_2) > -1
+    node2_single = routing.VehicleVar(newnode_2) == single
+    conditional_1 = solver.ConditionalExpression(
+        node1_on, node1_combo, 1)
+    conditional_2 = solver.ConditionalExpression(
+        node2_on, node2_single, 1)
+
+    solver.Add(conditional_1>=1)
+    solver.Add(conditional_2>=1)
+
+    # Force dummy nodes to go first
+    count_dimension.SetCumulVarSoftUpperBound(newnode_1,
+                                              1,
+                                              1000000)
+    count_dimension.SetCumulVarSoftUpperBound(newnode_2,
+                                              1,
+                                              1000000)
+
+    #Force minimal usage?
+    combo_used = count_dimension.CumulVar(routing.End(combo)) > 2
+    single_used = count_dimension.CumulVar(routing.End(single)) > 2
+
+    solver.Add(combo_used * single_used == 0)
+
+
+def interchangeable_pairs(data):
+    """Groups the vehicle pairs with identical capacities and costs.
+
+    Returns a list of the groups of more than one pair, each in pair
+    order; every permutation of a group's routes is an equivalent
+    solution.
+    """
+    capacities = data['vehicle_capacities']
+    costs = data['vehicle_costs']
+    groups = {}
+    for pair in range(0, len(costs)//2):
+        key = (capacities[2*pair], capacities[2*pair + 1],
+               costs[2*pair], costs[2*pair + 1])
+        groups.setdefault(key, []).append(pair)
+    return [pairs for pairs in groups.values() if len(pairs) > 1]
+
+def add_pair_symmetry_breaking(routing, pairs, mode, fake_nodes):
+    """Orders the use of interchangeable pairs, so only one of their permutations is feasible.
+
+    With mode 'used' a pair may only be used when the one before it is,
+    with mode 'size' no pair visits more nodes than the one before it.
+    Both read the 'count' dimension at the vehicle ends, where a vehicle
+    that left the depot for a node (beyond its dummy node, with
+    fake_nodes) has counted more than one (two) arcs.
+    """
+    solver = routing.solver()
+    count_dimension = routing.GetDimensionOrDie('count')
+    unused_count = 2 if fake_nodes else 1
+
+    def end_count(vehicle):
+        return count_dimension.CumulVar(routing.End(vehicle))
+
+    for earlier, later in zip(pairs, pairs[1:]):
+        if mode == 'size':
+            solver.Add(end_count(2*later) + end_count(2*later + 1)
+                       <= end_count(2*earlier) + end_count(2*earlier + 1))
+        elif mode == 'used':
+            solver.Add(solver.Max(end_count(2*later) > unused_count,
+                                  end_count(2*later + 1) > unused_count)
+                       <= solver.Max(end_count(2*earlier) > unused_count,
+                                     end_count(2*earlier + 1) > unused_count))
+        else:
+            raise ValueError('unknown symmetry breaking: {}'.format(mode))
+
+
+def restrict_to_neighbors(data, manager, routing, k):
+    """Leaves each demand node only arcs to its k nearest demand nodes.
+
+    The arcs from a demand node to the dummy nodes and to every vehicle
+    end stay, as does the arc to itself that marks it unperformed, and
+    the depot and dummy nodes keep all of theirs.  The search then only
+    looks at O(N*K) of the O(N^2) arcs.
+    """
+    num_demand_nodes = len(data['demands'])
+    num_nodes = len(data['distance_matrix'])
+    node_index = np.array([manager.NodeToIndex(node)
+                           for node in range(0, num_nodes)])
+    always = [int(node_index[node]) for node in range(num_demand_nodes, num_nodes)]
+    always.extend(routing.End(v) for v in range(0, routing.vehicles()))
+    neighbors = node_index[nearest_neighbors(
+        data['distance_matrix'], num_demand_nodes, k)]
+    for node, near in zip(range(1, num_demand_nodes), neighbors):
+        index = int(node_index[node])
+        routing.NextVar(index).SetValues(near.tolist() + always + [index])
+
+
+def cardinality_penalty(data, penalty):
+    """Returns penalty, or the default cardinality penalty when it is not positive.
+
+    truck cost < Penalty < truck with trailer cost
+    """
+    if penalty > 0:
+        return penalty
+    return 10 * data['vehicle_costs'][0] + 1
+
+
+def build_routing_model(data, callback_stats=None, **options):
+    """Builds the routing model for data once, without solving it.
+
+    Registers the transits, adds the 'Cost', 'Capacity' and 'count'
+    dimensions, the constraints keeping both vehicles of a pair from
+    being used, the ordering of interchangeable pairs and the node
+    disjunctions selected by options (see model_defaults).  With
+    fake_nodes the dummy nodes are appended to data['distance_matrix']
+    in place.  A callback_stats dict has the Python transit callbacks
+    profiled into it, see register_callback_transits.  Returns
+    (manager, routing).
+    """
+    unknown = set(options) - set(model_defaults)
+    if unknown:
+        raise TypeError('unknown model options: {}'.format(sorted(unknown)))
+    options = dict(model_defaults, **options)
+
+    num_veh = len(data['vehicle_costs'])
+    if options['fake_nodes']:
+        vehicle_pair_dummy_nodes(data, num_veh//2)
+
+    num_nodes = len(data['distance_matrix'])
+    # Create the routing index manager.
+    manager = pywrapcp.RoutingIndexManager(
+        num_nodes, num_veh, data['depot'])
+
+    # Create Routing Model.
+    routing = pywrapcp.RoutingModel(manager)
+
+    if options['matrix_transits']:
+        (transit_callback_index,
+         vehicle_transits,
+         demand_callback_index) = register_matrix_transits(data, routing)
+    elif options['table_transits']:
+        (transit_callback_index,
+         vehicle_transits,
+         demand_callback_index) = register_table_transits(
+             data, manager, routing, callback_stats)
+    else:
+        (transit_callback_index,
+         vehicle_transits,
+         demand_callback_index) = register_callback_transits(
+             data, manager, routing, callback_stats)
+
+    # use per-vehicle arc cost evaluators
+    for (t, v) in zip(vehicle_transits, range(0, num_veh)):
+        routing.SetArcCostEvaluatorOfVehicle(t, v)
+
+    # create travel cost dimension dependent on vehicle type
+    routing.AddDimensionWithVehicleTransits(
+        vehicle_transits,
+        0,      # no slack
+        cost_capacity, # some really large time
+        True,
+        'Cost')
+
+    # Add Capacity constraint.
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback_index,
+        0,  # null capacity slack
+        data['vehicle_capacities'],  # vehicle maximum capacities
+        True,  # start cumul to zero
+        'Capacity')
+
+    # count
+    routing.AddConstantDimension(
+        1, # increment by one every time
+        num_nodes,  # max count is visit all the nodes
+        True,  # set count to zero
+        'count')
+
+    # set constraints such that truck, truck and trailer cannot both be used
+    for veh_pair in range(0, num_veh//2):
+        # truck-trailer is first, truck single unit second
+        combo = veh_pair*2
+        single = veh_pair*2 + 1
+        if options['cumulative_constraint']:
+            add_cumulative_exclusion(routing, combo, single)
+        if options['count_constraint']:
+            add_count_exclusion(routing, combo, single)
+        if options['vehicle_used_constraint']:
+            add_vehicle_used_exclusion(routing, combo, single)
+        if options['fake_nodes_constraints']:
+            add_fake_node_constraints(data, manager, routing,
+                                      veh_pair, combo, single)
+
+    if options['symmetry_breaking']:
+        for pairs in interchangeable_pairs(data):
+            add_pair_symmetry_breaking(routing, pairs,
+                                       options['symmetry_breaking'],
+                                       options['fake_nodes'])
+
+    if options['neighbors'] > 0:
+        restrict_to_neighbors(data, manager, routing, options['neighbors'])
+
+    pickup_nodes = [manager.NodeToIndex(i)
+                    for i in range(1, len(data['demands']))]
+    if options['cardinality_disjunction']:
+        routing.AddDisjunction(
+            pickup_nodes,
+            cardinality_penalty(data, options['cardinality_penalty']),
+            options['cardinality'])
+    if options['single_disjunctions']:
+        for index in pickup_nodes:
+            routing.AddDisjunction([index], options['singlepenalty'])
+
+    return manager, routing
+
+
+def search_parameters(timelimit=None, first_solution=None, metaheuristic=None,
+                      log_search=False):
+    """Returns the search parameters the scripts share.
+
+    first_solution and metaheuristic are enum names, as in
+    routing_enums_pb2; None leaves the solver default.
+    """
+    parameters = pywrapcp.DefaultRoutingSearchParameters()
+    if timelimit is not None:
+        parameters.time_limit.seconds = timelimit
+    parameters.local_search_operators.use_path_lns = pywrapcp.BOOL_TRUE
+    parameters.local_search_operators.use_inactive_lns = pywrapcp.BOOL_TRUE
+    parameters.lns_time_limit.seconds = 10000  # 10000 milliseconds
+    if first_solution:
+        parameters.first_solution_strategy = getattr(
+            routing_enums_pb2.FirstSolutionStrategy, first_solution)
+    if metaheuristic:
+        parameters.local_search_metaheuristic = getattr(
+            routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic)
+    if log_search:
+        parameters.log_search = pywrapcp.BOOL_TRUE
+    return parameters
@@ -0,0 +1,287 @@
+"""Reading routes out of an assignment, and writing them out."""
+import json
+import time
+import numpy as np
+
+from .matrix import as_array
+
+
+def dropped_nodes(data, manager, routing, assignment):
+    """Returns the demand nodes left unvisited by assignment."""
+    dropped = []
+    for node in range(1, len(data['demands'])):
+        index = manager.NodeToIndex(node)
+        if assignment.Value(routing.NextVar(index)) == index:
+            dropped.append(node)
+    return dropped
+
+
+def solution_score(data, manager, routing, penalty):
+    """Scores the solution being reported on data, skipping any dummy nodes.
+
+    The score is the cost of every arc between demand nodes and the
+    depot, times the vehicle's cost multiplier, plus penalty for each
+    dropped demand node.  data is the instance before any dummy nodes
+    were added, so encodings that change the depot costs can be
+    compared.  Must be called from an at-solution callback.
+    """
+    num_demand_nodes = len(data['demands'])
+    cost = 0
+    visited = 0
+    for vehicle_id in range(0, routing.vehicles()):
+        previous = data['depot']
+        index = routing.NextVar(routing.Start(vehicle_id)).Value()
+        while True:
+            node = manager.IndexToNode(index)
+            if node < num_demand_nodes:
+                cost += (data['distance_matrix'][previous][node]
+                         * data['vehicle_costs'][vehicle_id])
+                previous = node
+                visited += node != data['depot']
+            if routing.IsEnd(index):
+                break
+            index = routing.NextVar(index).Value()
+    return int(cost + penalty * (num_demand_nodes - 1 - visited))
+
+
+def record_improvement(data, manager, routing, penalty, trace, start):
+    """At-solution hook appending (seconds since start, solution_score) for improving solutions."""
+    score = solution_score(data, manager, routing, penalty)
+    if not trace or score < trace[-1][1]:
+        trace.append((time.monotonic() - start, score))
+
+
+def extract_solution(data, manager, routing, assignment):
+    """Returns the routes of assignment as a columnar record.
+
+    The record is a dict of equally long NumPy arrays with one entry per
+    visit, vehicle starts and ends included, in route order: 'vehicle',
+    'node', 'load' (cumulative along the route), 'arc_cost' (of the arc
+    into the visit) and 'count' (position along the route).  Only the
+    next variables are read from the assignment; loads, costs and counts
+    are computed from the instance with array operations.
+    """
+    route_indices = []
+    route_lengths = []
+    for vehicle_id in range(0, routing.vehicles()):
+        index = routing.Start(vehicle_id)
+        route = [index]
+        while not routing.IsEnd(index):
+            index = assignment.Value(routing.NextVar(index))
+            route.append(index)
+        route_indices.extend(route)
+        route_lengths.append(len(route))
+    route_lengths = np.array(route_lengths)
+    index_to_node = np.array([manager.IndexToNode(index)
+                              for index in range(0, manager.GetNumberOfIndices())])
+    node = index_to_node[route_indices]
+    vehicle = np.repeat(np.arange(len(route_lengths)), route_lengths)
+    first = np.repeat(np.cumsum(route_lengths) - route_lengths, route_lengths)
+    count = np.arange(len(node)) - first
+
+    # dummy nodes appended by vehicle_dummy_nodes carry no demand
+    demands = np.zeros(len(data['distance_matrix']), dtype=np.int64)
+    demands[:len(data['demands'])] = data['demands']
+    visit_demand = demands[node]
+    visit_demand[np.cumsum(route_lengths) - 1] = 0  # nothing picked up at the end
+    load = np.cumsum(visit_demand)
+    load -= load[first] - visit_demand[first]
+
+    matrix = as_array(data['distance_matrix'])
+    vehicle_costs = np.asarray(data['vehicle_costs'], dtype=np.int64)
+    arc_cost = np.zeros(len(node), dtype=np.int64)
+    arc_cost[1:] = matrix[node[:-1], node[1:]] * vehicle_costs[vehicle[1:]]
+    arc_cost[count == 0] = 0
+    return {'vehicle': vehicle, 'node': node, 'load': load,
+            'arc_cost': arc_cost, 'count': count}
+
+
+def format_solution(solution):
+    """Renders a record from extract_solution as the familiar route text."""
+    lines = []
+    total_distance = 0
+    total_load = 0
+    ends = np.cumsum(np.bincount(solution['vehicle']))
+    starts = ends - np.bincount(solution['vehicle'])
+    for vehicle_id, (start, end) in enumerate(zip(starts, ends)):
+        visits = [' {0} Load({1}) Cost({2}) Count({3})'.format(
+            solution['node'][i], solution['load'][i],
+            solution['arc_cost'][i], solution['count'][i])
+                  for i in range(start, end)]
+        route_distance = int(solution['arc_cost'][start:end].sum())
+        route_load = int(solution['load'][end - 1])
+        lines.append('Route for vehicle {}:'.format(vehicle_id))
+        lines.append('-> '.join(visits))
+        lines.append('Distance of the route: {}m'.format(route_distance))
+        lines.append('Load of the route: {}\n'.format(route_load))
+        total_distance += route_distance
+        total_load += route_load
+    lines.append('Total distance of all routes: {}m'.format(total_distance))
+    lines.append('Total load of all routes: {}'.format(total_load))
+    return '\n'.join(lines)
+
+
+def print_solution(data, manager, routing, assignment):
+    """Prints assignment on console."""
+    print(format_solution(extract_solution(data, manager, routing, assignment)))
+
+
+def write_solution_json(solution, path):
+    """Writes a record from extract_solution as one JSON object of columns."""
+    with open(path, 'w') as solution_file:
+        json.dump({name: column.tolist() for (name, column) in solution.items()},
+                  solution_file, separators=(',', ':'))
+
+
+def write_solution_arrow(solution, path):
+    """Writes a record from extract_solution as an Arrow IPC file; needs pyarrow."""
+    import pyarrow
+    import pyarrow.feather
+    pyarrow.feather.write_feather(pyarrow.table(solution), path)
+
+# solution writers by file suffix; anything else is written as JSON
+solution_writers = {
+    '.arrow': write_solution_arrow,
+    '.feather': write_solution_arrow,
+}
+
+def write_solution(solution, path):
+    """Writes solution with the writer registered for path's suffix."""
+    for suffix, writer in solution_writers.items():
+        if path.endswith(suffix):
+            return writer(solution, path)
+    return write_solution_json(solution, path)
+
+
+def assignment_routes(manager, routing, assignment):
+    """Returns the nodes each vehicle visits, without its start and end."""
+    routes = []
+    for vehicle_id in range(0, routing.vehicles()):
+        route = []
+        index = assignment.Value(routing.NextVar(routing.Start(vehicle_id)))
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = assignment.Value(routing.NextVar(index))
+        routes.append(route)
+    return routes
+
+
+def read_assignment(manager, routing, routes):
+    """Loads per-vehicle node lists into an assignment of the closed model.
+
+    Nodes missing from routes are left unperformed.  Returns None when
+    the routes are not feasible for the model.
+    """
+    return routing.ReadAssignmentFromRoutes(
+        [[manager.NodeToIndex(node) for node in route] for route in routes],
+        True)
+
+
+def insert_missing_nodes(data, routes, exclusive=True):
+    """Returns routes with the demand nodes they leave out inserted where cheapest.
+
+    Nodes go in largest demand first, each where it adds the least arc
+    cost times the vehicle's cost, within the vehicle's capacity.  When
+    exclusive, as under any of checks.pair_exclusions, a node only goes
+    on a vehicle already in use or the first of an unused pair.  Nodes
+    that fit nowhere stay out.
+    """
+    matrix = as_array(data['distance_matrix'])
+    demands = np.asarray(data['demands'], dtype=np.int64)
+    depot = data['depot']
+    routes = [list(route) for route in routes]
+    loads = [int(sum(demands[node] for node in route if node < len(demands)))
+             for route in routes]
+    visited = set(node for route in routes for node in route)
+    missing = [node for node in range(0, len(demands))
+               if node != depot and node not in visited]
+    missing.sort(key=lambda node: -demands[node])
+    # a vehicle is in use once it visits a demand node; dummy nodes do not count
+    in_use = [any(node < len(demands) for node in route) for route in routes]
+    for node in missing:
+        best = None
+        for vehicle, route in enumerate(routes):
+            partner = vehicle + 1 if vehicle % 2 == 0 else vehicle - 1
+            if exclusive and not in_use[vehicle] and (
+                    vehicle % 2 or (partner < len(routes) and in_use[partner])):
+                continue
+            if loads[vehicle] + demands[node] > data['vehicle_capacities'][vehicle]:
+                continue
+            stops = [depot] + route + [depot]
+            before = np.array(stops[:-1])
+            after = np.array(stops[1:])
+            added = (np.asarray(matrix[before, node], dtype=np.int64)
+                     + np.asarray(matrix[node, after], dtype=np.int64)
+                     - np.asarray(matrix[before, after], dtype=np.int64))
+            position = int(np.argmin(added))
+            cost = int(added[position]) * data['vehicle_costs'][vehicle]
+            if best is None or cost < best[0]:
+                best = (cost, vehicle, position)
+        if best is not None:
+            _, vehicle, position = best
+            routes[vehicle].insert(position, node)
+            loads[vehicle] += int(demands[node])
+            in_use[vehicle] = True
+    return routes
+
+
+def partial_assignment(manager, routing, routes):
+    """Returns an assignment fixing only the successors along routes.
+
+    Every route runs from its vehicle's start through its nodes; the
+    successor of its last node, the start of an empty route and the
+    successors of the nodes in no route stay unbound, so
+    SolveFromAssignmentWithParameters can append the missing nodes to
+    any route.  Unlike read_assignment it accepts routes that leave out
+    mandatory nodes.
+    """
+    assignment = routing.solver().Assignment()
+    for vehicle, route in enumerate(routes):
+        index = routing.Start(vehicle)
+        for node in route:
+            next_index = manager.NodeToIndex(node)
+            assignment.Add(routing.NextVar(index))
+            assignment.SetValue(routing.NextVar(index), next_index)
+            index = next_index
+    return assignment
+
+
+def save_routes(path, data, routes):
+    """Writes routes to path as compact JSON.
+
+    The number of demand nodes is stored alongside, so load_routes can
+    tell dummy nodes from demand nodes when the instance changes.
+    """
+    with open(path, 'w') as routes_file:
+        json.dump({'demand_nodes': len(data['demands']), 'routes': routes},
+                  routes_file, separators=(',', ':'))
+
+
+def load_routes(path, data, num_veh):
+    """Reads routes written by save_routes and fits them to data.
+
+    Demand nodes that no longer exist are dropped and new ones are left
+    out, to be inserted by the search.  Dummy nodes follow the demand
+    nodes, so they are shifted by the change in demand node count and
+    dropped when their vehicle pair no longer exists.  Routes of
+    vehicles beyond num_veh are ignored, and missing ones start empty.
+    """
+    with open(path) as routes_file:
+        saved = json.load(routes_file)
+    old_demand_nodes = saved['demand_nodes']
+    demand_nodes = len(data['demands'])
+    num_nodes = len(data['distance_matrix'])
+    routes = []
+    for route in saved['routes'][:num_veh]:
+        kept = []
+        for node in route:
+            if node >= old_demand_nodes:
+                node += demand_nodes - old_demand_nodes
+                if node >= num_nodes:
+                    continue
+            elif node >= demand_nodes:
+                continue
+            kept.append(node)
+        routes.append(kept)
+    routes.extend([] for _ in range(len(routes), num_veh))
+    return routes
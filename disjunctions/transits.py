@@ -0,0 +1,168 @@
+"""Transit evaluators for distance, per-vehicle cost and demand."""
+from functools import partial
+import time
+import numpy as np
+
+from .matrix import CompactMatrix
+
+
+def distance_callback(data, manager, from_index, to_index):
+    """Returns the distance between the two nodes."""
+    # Convert from routing variable Index to distance matrix NodeIndex.
+    from_node = manager.IndexToNode(from_index)
+    to_node = manager.IndexToNode(to_index)
+    return data['distance_matrix'][from_node][to_node]
+
+def vehicle_distance_callback(data, vehicle, manager, from_index, to_index):
+    """Returns the distance between the two nodes for a vehicle."""
+    # Convert from routing variable Index to distance matrix NodeIndex.
+    from_node = manager.IndexToNode(from_index)
+    to_node = manager.IndexToNode(to_index)
+
+    return data['distance_matrix'][from_node][to_node]*data['vehicle_costs'][vehicle]
+
+def demand_callback(data, manager,from_index):
+    """Returns the demand of the node."""
+    # Convert from routing variable Index to demands NodeIndex.
+    from_node = manager.IndexToNode(from_index)
+    if from_node < len( data['demands'] ):
+        return data['demands'][from_node]
+    return 0
+
+def vehicle_cost_classes(data):
+    """Groups vehicles by cost multiplier.
+
+    Returns a dict mapping each distinct entry of data['vehicle_costs']
+    to the list of vehicles using it, in order of first appearance.
+    """
+    classes = {}
+    for vehicle, cost in enumerate(data['vehicle_costs']):
+        classes.setdefault(cost, []).append(vehicle)
+    return classes
+
+def profiled(stats, name, callback):
+    """Wraps callback so stats[name] counts its calls and the nanoseconds spent in them."""
+    counter = stats.setdefault(name, [0, 0])
+    def wrapped(*args):
+        start = time.perf_counter_ns()
+        value = callback(*args)
+        counter[1] += time.perf_counter_ns() - start
+        counter[0] += 1
+        return value
+    return wrapped
+
+def register_callback_transits(data, manager, routing, stats=None):
+    """Registers the Python distance, per-vehicle cost and demand callbacks.
+
+    One cost callback is registered per cost class and shared by every
+    vehicle in it.  With a stats dict every callback is wrapped by
+    profiled, under 'distance', 'demand' and 'cost <multiplier>
+    vehicles <list>' for the cost classes.  Returns (distance,
+    per-vehicle cost list, demand) evaluator indices.
+    """
+    def register(name, callback):
+        if stats is None:
+            return callback
+        return profiled(stats, name, callback)
+
+    num_veh = len(data['vehicle_costs'])
+    transit_callback_index = routing.RegisterTransitCallback(register(
+        'distance', partial(distance_callback, data, manager)))
+    vehicle_transits = [None] * num_veh
+    for cost, vehicles in vehicle_cost_classes(data).items():
+        # any vehicle of the class gives the same multiplier
+        class_transit = routing.RegisterTransitCallback(register(
+            'cost {} vehicles {}'.format(cost, vehicles),
+            partial(vehicle_distance_callback, data, vehicles[0], manager)))
+        for v in vehicles:
+            vehicle_transits[v] = class_transit
+    demand_callback_index = routing.RegisterUnaryTransitCallback(register(
+        'demand', partial(demand_callback, data, manager)))
+    return transit_callback_index, vehicle_transits, demand_callback_index
+
+def table_callback(table, num_nodes, multiplier, index_to_node,
+                   from_index, to_index):
+    """Returns the arc value from a flat table through the index to node list, times multiplier."""
+    return table[index_to_node[from_index] * num_nodes
+                 + index_to_node[to_index]] * multiplier
+
+def compact_callback(arc, multiplier, index_to_node, from_index, to_index):
+    """Returns the arc value from a CompactMatrix's arc method through the index to node list, times multiplier."""
+    return arc(index_to_node[from_index], index_to_node[to_index]) * multiplier
+
+def index_callback(values, from_index):
+    """Returns the value of a node from a list by routing index."""
+    return values[from_index]
+
+def arc_table(matrix):
+    """Returns matrix as a flat int64 memoryview.
+
+    A C-contiguous int64 matrix, such as a memory-mapped instance file,
+    is viewed without a copy, so every cost class and every process
+    mapping the same file read the same memory; anything else is copied
+    once.  Indexing a memoryview from Python yields plain ints, without
+    going through NumPy scalars.
+    """
+    return memoryview(np.ascontiguousarray(matrix, dtype=np.int64).reshape(-1))
+
+def register_table_transits(data, manager, routing, stats=None):
+    """Registers Python callbacks reading the matrix as one flat table.
+
+    Every callback reads the same table from arc_table and scales it by
+    its cost class, and indices are translated with a list built once
+    from the manager, so no call goes through IndexToNode or the data
+    dict.  Build it after any dummy nodes were added.  A CompactMatrix
+    is read through its arc method instead, which keeps its compact
+    storage.  stats and the return value are as for
+    register_callback_transits.
+    """
+    def register(name, callback):
+        if stats is None:
+            return callback
+        return profiled(stats, name, callback)
+
+    matrix = data['distance_matrix']
+    num_nodes = len(matrix)
+    index_to_node = [manager.IndexToNode(index)
+                     for index in range(0, manager.GetNumberOfIndices())]
+    if isinstance(matrix, CompactMatrix):
+        arc_callback = partial(compact_callback, matrix.arc)
+    else:
+        arc_callback = partial(table_callback, arc_table(matrix), num_nodes)
+    transit_callback_index = routing.RegisterTransitCallback(register(
+        'distance', partial(arc_callback, 1, index_to_node)))
+    vehicle_transits = [None] * len(data['vehicle_costs'])
+    for cost, vehicles in vehicle_cost_classes(data).items():
+        class_transit = routing.RegisterTransitCallback(register(
+            'cost {} vehicles {}'.format(cost, vehicles),
+            partial(arc_callback, cost, index_to_node)))
+        for v in vehicles:
+            vehicle_transits[v] = class_transit
+    # dummy nodes appended by vehicle_dummy_nodes carry no demand
+    demands = [0] * num_nodes
+    demands[:len(data['demands'])] = [int(d) for d in data['demands']]
+    demand_callback_index = routing.RegisterUnaryTransitCallback(register(
+        'demand', partial(index_callback,
+                          [demands[node] for node in index_to_node])))
+    return transit_callback_index, vehicle_transits, demand_callback_index
+
+def register_matrix_transits(data, routing):
+    """Hands the distance matrix, per-vehicle cost matrices and demands to the solver.
+
+    The values are copied into the solver, so no Python runs when the
+    search evaluates an arc or a node demand.  Returns the same
+    (distance, per-vehicle cost list, demand) evaluator indices as
+    register_callback_transits.
+    """
+    matrix = np.asarray(data['distance_matrix'], dtype=np.int64)
+    transit_callback_index = routing.RegisterTransitMatrix(matrix.tolist())
+    vehicle_transits = [None] * len(data['vehicle_costs'])
+    for cost, vehicles in vehicle_cost_classes(data).items():
+        class_transit = routing.RegisterTransitMatrix((matrix * cost).tolist())
+        for v in vehicles:
+            vehicle_transits[v] = class_transit
+    # dummy nodes appended by vehicle_dummy_nodes carry no demand
+    demands = np.zeros(len(matrix), dtype=np.int64)
+    demands[:len(data['demands'])] = data['demands']
+    demand_callback_index = routing.RegisterUnaryTransitVector(demands.tolist())
+    return transit_callback_index, vehicle_transits, demand_callback_index
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Solve a stream of instances without paying process startup per solve.
+
+Instances arrive as newline-delimited JSON objects, on stdin or on the
+connections to a local Unix socket, and are solved by a pool of worker
+processes that import ortools and numpy once and keep a cache of built
+models.  Every result is written back as one JSON line as soon as it is
+done, so results may come back in a different order than the requests.
+
+The keys of a request are disjunction_fail.py dest names overriding the
+options given after --, plus:
+
+    id               echoed back in the result
+    distance_matrix  the matrix, inline; or give matrix_file instead
+    demands          the node demands, inline, with distance_matrix
+    vehicles         the number of vehicle pairs
+
+e.g.
+
+    ./solve_server.py -- -t,--timelimit 5 --cumulative_constraint < requests.jsonl
+    ./solve_server.py --socket /tmp/solve.sock -- -t,--timelimit 5
+"""
+from contextlib import redirect_stdout
+from functools import partial
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+import disjunction_fail
+import disjunctions
+
+
+# each worker process keeps its own cache of built models, and the
+# options not given in a request
+worker_cache = None
+worker_base = None
+
+def init_worker(base, cache_size, cache_policy):
+    """Pool initializer storing the base options and a model cache, unless cache_size is 0.
+
+    Workers ignore SIGINT: Ctrl-C reaches the whole process group, and
+    only the server should handle it, shutting the pool down.
+    """
+    global worker_cache, worker_base
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_base = base
+    if cache_size > 0:
+        worker_cache = disjunctions.ModelCache(cache_size, cache_policy)
+
+
+def request_args(request):
+    """Returns the base options overridden by the keys of request."""
+    args = argparse.Namespace(**vars(worker_base))
+    for name, value in request.items():
+        if name == 'id':
+            continue
+        if name not in ('distance_matrix', 'demands') and not hasattr(args, name):
+            raise ValueError('unknown option: {}'.format(name))
+        setattr(args, name, value)
+    if getattr(args, 'distance_matrix', None) is not None:
+        if getattr(args, 'demands', None) is None:
+            raise ValueError('distance_matrix given without demands')
+    return args
+
+
+def solve_request(line):
+    """Solves the instance on one request line; returns its result line.
+
+    model_cache in the result is hit or miss when the worker's cache
+    was asked for the model, and empty otherwise.
+    """
+    result = {'id': None, 'model_cache': ''}
+    start = time.perf_counter()
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError('a request must be a JSON object')
+        result['id'] = request.get('id')
+        args = request_args(request)
+        reasons = disjunction_fail.precheck(args)
+        assignment = None
+        if not reasons:
+            hits = worker_cache.hits if worker_cache else 0
+            misses = worker_cache.misses if worker_cache else 0
+            try:
+                with redirect_stdout(io.StringIO()):
+                    data, manager, routing, assignment = disjunction_fail.solve(
+                        args, worker_cache)
+            finally:
+                if worker_cache is not None and worker_cache.hits > hits:
+                    result['model_cache'] = 'hit'
+                elif worker_cache is not None and worker_cache.misses > misses:
+                    result['model_cache'] = 'miss'
+        if reasons:
+            result['status'] = 'infeasible'
+            result['reasons'] = reasons
+        elif assignment:
+            result['status'] = 'solved'
+            result['objective'] = assignment.ObjectiveValue()
+            result['dropped_nodes'] = disjunctions.dropped_nodes(
+                data, manager, routing, assignment)
+            result['routes'] = disjunctions.assignment_routes(manager, routing, assignment)
+        else:
+            result['status'] = 'no assignment'
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+    result['wall_time'] = round(time.perf_counter() - start, 3)
+    return json.dumps(result, separators=(',', ':'))
+
+
+def request_lines(stream):
+    """Yields the non-blank lines of stream as they arrive."""
+    for line in stream:
+        if line.strip():
+            yield line
+
+
+def write_result(output, lock, result):
+    """Pool callback writing one result line to output.
+
+    A reader that went away loses its results; raising here would stop
+    the pool's result thread, and with it every other stream.
+    """
+    with lock:
+        try:
+            output.write(result + '\n')
+            output.flush()
+        except (OSError, ValueError):
+            pass
+
+
+def serve_stream(pool, requests, output):
+    """Solves every request line of requests, writing results to output as they finish.
+
+    Lines are read here and handed to the pool one by one, rather than
+    giving the pool the stream, whose single task thread would then
+    wait on this stream's reads while other streams have work queued.
+    """
+    lock = threading.Lock()
+    pending = []
+    for line in request_lines(requests):
+        pending = [result for result in pending if not result.ready()]
+        pending.append(pool.apply_async(
+            solve_request, (line,), callback=partial(write_result, output, lock)))
+    for result in pending:
+        result.wait()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Serves the requests of one socket connection."""
+
+    def handle(self):
+        requests = io.TextIOWrapper(self.rfile, encoding='utf-8')
+        output = io.TextIOWrapper(self.wfile, encoding='utf-8')
+        serve_stream(self.server.pool, requests, output)
+
+
+class SolveServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server sharing one worker pool between its connections."""
+
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        super().__init__(path, RequestHandler)
+
+
+def main():
+    argv = sys.argv[1:]
+    solver_argv = []
+    if '--' in argv:
+        split = argv.index('--')
+        argv, solver_argv = argv[:split], argv[split+1:]
+
+    parser = argparse.ArgumentParser(description='Solve newline-delimited JSON instances from stdin or a Unix socket on a pool of workers')
+    parser.add_argument('--socket', type=str, dest='socket', default=None,
+                        help='Unix socket path to serve instead of stdin')
+    parser.add_argument('--workers', type=int, dest='workers', default=os.cpu_count(),
+                        help='number of solver processes; defaults to the number of cores')
+    parser.add_argument('--model_cache', type=int, dest='model_cache', default=8,
+                        help='built models each worker keeps for reuse by later requests for the same model; 0 turns the cache off; default 8')
+    parser.add_argument('--cache_policy', type=str, dest='cache_policy', default='lru',
+                        help='which model a full cache evicts, lru or fifo; default lru')
+    args = parser.parse_args(argv)
+    # checked after parsing, so --help does not wait for ortools
+    if args.cache_policy not in disjunctions.ModelCache.policies:
+        parser.error('unknown cache policy: {}'.format(args.cache_policy))
+
+    base = disjunction_fail.build_parser().parse_args(solver_argv)
+    with multiprocessing.Pool(args.workers, init_worker,
+                              (base, args.model_cache, args.cache_policy)) as pool:
+        if args.socket is None:
+            serve_stream(pool, sys.stdin, sys.stdout)
+            return
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = SolveServer(args.socket, pool)
+        print('serving on', args.socket, 'with', args.workers, 'workers',
+              file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Sweep a grid of disjunction_fail.py options in parallel.
+
+Every combination of the --grid values is solved in its own worker
+process, with the pool sized to the machine's cores by default, and one
+row per run is written to a CSV file.  Options not on the grid come from
+the arguments after --, which are parsed exactly like
+disjunction_fail.py's own command line, e.g.
+
+    ./sweep.py --grid fake_nodes=0,1 --grid first_solution=SAVINGS,GLOBAL_CHEAPEST_ARC -- --seven -t,--timelimit 10
+"""
+from contextlib import redirect_stdout
+from itertools import product
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+import disjunction_fail
+import disjunctions
+
+
+# swept when no --grid is given: the encodings and the strategies that work
+default_grid = [
+    ('single_disjunctions', [False, True]),
+    ('cumulative_constraint', [False, True]),
+    ('fake_nodes', [False, True]),
+    ('guided_local', [False, True]),
+    ('first_solution', ['LOCAL_CHEAPEST_ARC', 'GLOBAL_CHEAPEST_ARC', 'SAVINGS']),
+]
+
+result_fields = ['status', 'objective', 'wall_time', 'dropped_nodes', 'model_cache', 'error']
+
+# each worker process keeps its own cache of built models
+worker_cache = None
+
+def init_worker(cache_size, cache_policy):
+    """Pool initializer giving the worker a model cache, unless cache_size is 0."""
+    global worker_cache
+    if cache_size > 0:
+        worker_cache = disjunctions.ModelCache(cache_size, cache_policy)
+
+
+def parse_value(text, action):
+    """Converts one grid value like the disjunction_fail.py option action would.
+
+    Flags take 1/0, true/false, yes/no or on/off, and an option without
+    a default also takes none.
+    """
+    if isinstance(action, (argparse._StoreTrueAction, argparse._StoreFalseAction)):
+        if text.lower() in ('1', 'true', 'yes', 'on'):
+            return True
+        if text.lower() in ('0', 'false', 'no', 'off'):
+            return False
+        raise ValueError('not a boolean for {}: {}'.format(action.dest, text))
+    if action.default is None and text.lower() == 'none':
+        return None
+    value = action.type(text) if action.type is not None else text
+    if action.choices is not None and value not in action.choices:
+        raise ValueError('invalid {}: {} (choose from {})'.format(
+            action.dest, text, ', '.join(map(str, action.choices))))
+    return value
+
+
+def parse_grid(specs, parser):
+    """Turns NAME=V1,V2 specs into (name, values) axes typed by parser's option actions."""
+    actions = {action.dest: action for action in parser._actions}
+    grid = []
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in actions or name == 'help':
+            raise ValueError('unknown option in grid: {}'.format(name))
+        grid.append((name, [parse_value(v, actions[name]) for v in values.split(',')]))
+    return grid
+
+
+def grid_runs(grid):
+    """Yields one dict of option overrides per point of the grid."""
+    names = [name for (name, _) in grid]
+    for values in product(*[values for (_, values) in grid]):
+        yield dict(zip(names, values))
+
+
+def run_one(job):
+    """Solves one grid point and returns its results row."""
+    base, overrides = job
+    args = argparse.Namespace(**vars(base))
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    row = dict(overrides)
+    hits = worker_cache.hits if worker_cache else 0
+    start = time.perf_counter()
+    infeasible = bool(disjunction_fail.precheck(args))
+    assignment = None
+    error = None
+    if not infeasible:
+        try:
+            with redirect_stdout(io.StringIO()):
+                data, manager, routing, assignment = disjunction_fail.solve(
+                    args, worker_cache)
+        except Exception as exception:
+            error = exception
+    row['wall_time'] = round(time.perf_counter() - start, 3)
+    if error is not None:
+        error = error.__cause__ or error
+        row['error'] = '{}: {}'.format(type(error).__name__, error)
+    else:
+        row['error'] = ''
+    if worker_cache is None or infeasible:
+        row['model_cache'] = ''
+    else:
+        row['model_cache'] = 'hit' if worker_cache.hits > hits else 'miss'
+    if infeasible:
+        row['status'] = 'infeasible'
+        row['objective'] = ''
+        row['dropped_nodes'] = ''
+    elif error is not None:
+        row['status'] = 'error'
+        row['objective'] = ''
+        row['dropped_nodes'] = ''
+    elif assignment:
+        row['status'] = 'solved'
+        row['objective'] = assignment.ObjectiveValue()
+        row['dropped_nodes'] = len(disjunctions.dropped_nodes(
+            data, manager, routing, assignment))
+    else:
+        row['status'] = 'no assignment'
+        row['objective'] = ''
+        row['dropped_nodes'] = ''
+    return row
+
+
+def main():
+    argv = sys.argv[1:]
+    solver_argv = []
+    if '--' in argv:
+        split = argv.index('--')
+        argv, solver_argv = argv[:split], argv[split+1:]
+
+    parser = argparse.ArgumentParser(description='Solve every combination of a grid of disjunction_fail.py options in parallel')
+    parser.add_argument('--grid', action='append', dest='grid', default=[],
+                        help='NAME=V1,V2,... option values to sweep, using the disjunction_fail.py dest names; repeat for more axes')
+    parser.add_argument('--workers', type=int, dest='workers', default=os.cpu_count(),
+                        help='number of solver processes; defaults to the number of cores')
+    parser.add_argument('--output', type=str, dest='output', default='sweep_results.csv',
+                        help='CSV file to write one row per run to; default sweep_results.csv')
+    parser.add_argument('--model_cache', type=int, dest='model_cache', default=8,
+                        help='built models each worker keeps for reuse by later runs of the same model; 0 turns the cache off; default 8')
+    parser.add_argument('--cache_policy', type=str, dest='cache_policy', default='lru',
+                        help='which model a full cache evicts, lru or fifo; default lru')
+    args = parser.parse_args(argv)
+    # checked after parsing, so --help does not wait for ortools
+    if args.cache_policy not in disjunctions.ModelCache.policies:
+        parser.error('unknown cache policy: {}'.format(args.cache_policy))
+
+    solver_parser = disjunction_fail.build_parser()
+    base = solver_parser.parse_args(solver_argv)
+    try:
+        grid = parse_grid(args.grid, solver_parser) if args.grid else default_grid
+    except ValueError as error:
+        parser.error(str(error))
+    jobs = [(base, overrides) for overrides in grid_runs(grid)]
+    print('running', len(jobs), 'solves on', args.workers, 'workers, time limit',
+          base.timelimit, 's each')
+
+    fields = [name for (name, _) in grid] + result_fields
+    with open(args.output, 'w', newline='') as output, \
+         multiprocessing.Pool(args.workers, init_worker,
+                              (args.model_cache, args.cache_policy)) as pool:
+        writer = csv.DictWriter(output, fieldnames=fields)
+        writer.writeheader()
+        cache_use = {'hit': 0, 'miss': 0, '': 0}
+        for row in pool.imap_unordered(run_one, jobs):
+            writer.writerow(row)
+            output.flush()
+            cache_use[row['model_cache']] += 1
+            print(row)
+    if args.model_cache > 0:
+        print('model cache hits', cache_use['hit'], 'misses', cache_use['miss'])
+    print('wrote', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""ModelCache eviction and the fingerprints it is keyed by."""
+import hashlib
+import numpy as np
+
+from disjunctions.cache import ModelCache
+from disjunctions.cache import instance_fingerprint
+from disjunctions.cache import update_digest
+from disjunctions.instance import synthetic_data_model
+from disjunctions.matrix import CompactMatrix
+
+
+def instances(count):
+    return [synthetic_data_model(6, 1, seed=seed) for seed in range(0, count)]
+
+
+def test_lru_evicts_least_recently_used():
+    first, second, third = instances(3)
+    cache = ModelCache(maxsize=2, policy='lru')
+    routing = cache.get(first, {})[2]
+    cache.get(second, {})
+    assert cache.get(first, {})[2] is routing
+    cache.get(third, {})
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2}
+    # second was used least recently
+    assert cache.get(first, {})[2] is routing
+    cache.get(second, {})
+    assert cache.stats() == {'hits': 2, 'misses': 4, 'evictions': 2, 'size': 2}
+
+
+def test_fifo_evicts_oldest():
+    first, second, third = instances(3)
+    cache = ModelCache(maxsize=2, policy='fifo')
+    routing = cache.get(first, {})[2]
+    cache.get(second, {})
+    assert cache.get(first, {})[2] is routing
+    cache.get(third, {})
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2}
+    # first went in first, however recently it was used
+    assert cache.get(first, {})[2] is not routing
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'evictions': 2, 'size': 2}
+
+
+def test_hit_returns_cached_data_and_empty_hooks():
+    data = instances(1)[0]
+    cache = ModelCache()
+    cached, _, routing, hooks = cache.get(data, {'fake_nodes': True})
+    hooks.append(print)
+    hooks.errors.append(ValueError())
+    again = cache.get(synthetic_data_model(6, 1, seed=0), {'fake_nodes': True})
+    assert again[0] is cached and again[2] is routing and again[3] is hooks
+    assert hooks == [] and hooks.errors == []
+
+
+def test_maxsize_zero_keeps_nothing():
+    data = instances(1)[0]
+    cache = ModelCache(maxsize=0)
+    cache.get(data, {})
+    cache.get(data, {})
+    assert cache.stats() == {'hits': 0, 'misses': 2, 'evictions': 2, 'size': 0}
+
+
+def test_unknown_policy():
+    try:
+        ModelCache(policy='random')
+    except ValueError as error:
+        assert 'random' in str(error)
+    else:
+        raise AssertionError('a random policy was accepted')
+
+
+def test_fingerprint_of_lists_and_arrays():
+    data = synthetic_data_model(12, 2, seed=0)
+    arrays = synthetic_data_model(12, 2, seed=0, as_lists=False)
+    assert instance_fingerprint(data, {}) == instance_fingerprint(data, {})
+    assert instance_fingerprint(data, {}) == instance_fingerprint(arrays, {})
+    narrow = dict(arrays, distance_matrix=arrays['distance_matrix'].astype(np.int32))
+    assert instance_fingerprint(narrow, {}) == instance_fingerprint(data, {})
+
+
+def test_fingerprint_changes():
+    data = synthetic_data_model(12, 2, seed=0, as_lists=False)
+    key = instance_fingerprint(data, {})
+    # options at their defaults are the same model
+    assert instance_fingerprint(data, {'fake_nodes': False}) == key
+    assert instance_fingerprint(data, {'fake_nodes': True}) != key
+    assert instance_fingerprint(data, {}, ('SAVINGS', 'GREEDY_DESCENT')) != key
+    moved = dict(data, distance_matrix=data['distance_matrix'].copy())
+    moved['distance_matrix'][3, 4] += 1
+    assert instance_fingerprint(moved, {}) != key
+    assert instance_fingerprint(dict(data, depot=1), {}) != key
+    assert instance_fingerprint(dict(data, vehicle_costs=[5, 1, 5, 2]), {}) != key
+
+
+def test_fingerprint_of_compact_matrix():
+    data = synthetic_data_model(12, 2, seed=0, as_lists=False)
+    compact = dict(data, distance_matrix=CompactMatrix.from_matrix(data['distance_matrix']))
+    key = instance_fingerprint(compact, {})
+    assert key != instance_fingerprint(data, {})
+    again = dict(data, distance_matrix=CompactMatrix.from_matrix(data['distance_matrix']))
+    assert instance_fingerprint(again, {}) == key
+
+
+def test_update_digest_in_chunks():
+    values = np.arange(100, dtype=np.int32).reshape(10, 10)
+    whole = hashlib.blake2b(digest_size=16)
+    update_digest(whole, values, np.int64)
+    chunked = hashlib.blake2b(digest_size=16)
+    update_digest(chunked, values, np.int64, chunk=7)
+    assert whole.hexdigest() == chunked.hexdigest()
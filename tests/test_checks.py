@@ -0,0 +1,82 @@
+"""The reasons infeasibility_reasons gives, and the ones it must not."""
+import numpy as np
+
+from disjunctions.checks import cheapest_arrivals
+from disjunctions.checks import cost_capacity
+from disjunctions.checks import fleet_capacity
+from disjunctions.checks import infeasibility_reasons
+from disjunctions.checks import pair_exclusions
+
+
+def small_data(demands=(0, 2, 3, 4, 1), capacities=(12, 3), distance=10):
+    size = len(demands)
+    matrix = np.full((size, size), distance, dtype=np.int64)
+    np.fill_diagonal(matrix, 0)
+    return {'distance_matrix': matrix,
+            'demands': list(demands),
+            'vehicle_capacities': list(capacities),
+            'vehicle_costs': [5, 1] * (len(capacities) // 2),
+            'depot': 0}
+
+
+def test_feasible_instance_has_no_reason():
+    data = small_data()
+    assert infeasibility_reasons(data) == []
+    for name in pair_exclusions:
+        assert infeasibility_reasons(data, **{name: True}) == []
+
+
+def test_node_bigger_than_every_vehicle():
+    reasons = infeasibility_reasons(small_data(demands=(0, 2, 9, 4, 1),
+                                               capacities=(8, 8)))
+    assert reasons[0] == '1 nodes, e.g. node 2 with demand 9, need more than the largest vehicle capacity 8'
+    assert len(reasons) == 2
+    assert reasons[-1] == 'no disjunction lets a node be dropped'
+
+
+def test_fleet_capacity_with_one_vehicle_per_pair():
+    # total demand 10: both vehicles of the pair hold 11, the combo alone 8
+    data = small_data(capacities=(8, 3))
+    assert infeasibility_reasons(data) == []
+    for name in pair_exclusions:
+        reasons = infeasibility_reasons(data, **{name: True})
+        assert reasons == ['total demand 10 exceeds the fleet capacity 8 with one vehicle per pair',
+                           'no disjunction lets a node be dropped']
+    reasons = infeasibility_reasons(small_data(capacities=(6, 3)))
+    assert reasons[0] == 'total demand 10 exceeds the fleet capacity 9'
+
+
+def test_fleet_capacity():
+    data = small_data(capacities=(8, 3, 2, 6, 5))
+    assert fleet_capacity(data, False) == 24
+    # a vehicle without a partner counts whole
+    assert fleet_capacity(data, True) == 8 + 6 + 5
+
+
+def test_cost_bound():
+    # four demand nodes, each entered from another at 10**6, two vehicles
+    data = small_data(distance=10**6)
+    reasons = infeasibility_reasons(data)
+    assert len(reasons) == 2
+    assert reasons[0] == 'visiting every node costs at least {}, more than 2 vehicles accrue at {} each'.format(
+        2 * 10**6, cost_capacity)
+    # as many vehicles as nodes: each route may start from the depot
+    data['vehicle_capacities'] = [8, 3] * 2
+    data['vehicle_costs'] = [5, 1] * 2
+    assert infeasibility_reasons(data) == []
+
+
+def test_cheapest_arrivals():
+    matrix = np.array([[0, 1, 1, 1],
+                       [1, 0, 7, 4],
+                       [1, 5, 0, 9],
+                       [1, 6, 2, 0]])
+    assert cheapest_arrivals(matrix, 4).tolist() == [5, 2, 4]
+    assert cheapest_arrivals(matrix.tolist(), 4, chunk=1).tolist() == [5, 2, 4]
+
+
+def test_disjunctions_short_circuit():
+    data = small_data(demands=(0, 2, 9, 4, 1), capacities=(2, 1), distance=10**6)
+    assert len(infeasibility_reasons(data)) == 4
+    assert infeasibility_reasons(data, single_disjunctions=True) == []
+    assert infeasibility_reasons(data, cardinality_disjunction=True) == []
@@ -0,0 +1,70 @@
+"""Cluster instances and the routes stitched back from them."""
+import numpy as np
+
+from disjunctions.decompose import cluster_instance
+from disjunctions.decompose import decompose_instance
+from disjunctions.decompose import stitch_routes
+from disjunctions.instance import synthetic_data_model
+from disjunctions.instance import vehicle_pair_dummy_nodes
+
+
+def two_clusters(data):
+    # pair 0 serves nodes 3, 5 and 7, pairs 1 and 2 the rest
+    first = np.array([3, 5, 7])
+    second = np.array([1, 2, 4, 6, 8, 9, 10, 11, 12])
+    return [(first, 0, cluster_instance(data, first, 0, 1)),
+            (second, 1, cluster_instance(data, second, 1, 2))]
+
+
+def test_cluster_instance():
+    data = synthetic_data_model(13, 3, seed=0, as_lists=False)
+    (members, _, sub), _ = two_clusters(data)
+    nodes = [0, 3, 5, 7]
+    assert np.array_equal(sub['distance_matrix'],
+                          data['distance_matrix'][np.ix_(nodes, nodes)])
+    assert np.array_equal(sub['demands'], data['demands'][nodes])
+    assert sub['vehicle_capacities'] == data['vehicle_capacities'][0:2]
+    assert sub['vehicle_costs'] == data['vehicle_costs'][0:2]
+
+
+def test_stitch_maps_nodes_and_vehicles():
+    data = synthetic_data_model(13, 3, seed=0, as_lists=False)
+    clusters = two_clusters(data)
+    cluster_routes = [[[2, 1], [3]],
+                      [[9, 1], [], [5, 4, 3], [2, 7]]]
+    routes = stitch_routes(clusters, cluster_routes, 6, 13)
+    assert routes == [[5, 3], [7], [12, 1], [], [8, 6, 4], [2, 10]]
+
+
+def test_stitch_shifts_dummy_nodes():
+    data = synthetic_data_model(13, 3, seed=0, as_lists=False)
+    clusters = two_clusters(data)
+    # the dummy nodes each pair owns in the whole instance
+    whole = list(vehicle_pair_dummy_nodes(dict(data), 3))
+    assert whole == list(range(13, 19))
+    cluster_routes = []
+    for _, _, sub in clusters:
+        pairs = len(sub['vehicle_costs']) // 2
+        dummy = list(vehicle_pair_dummy_nodes(dict(sub), pairs))
+        # every vehicle of the cluster visits its own dummy node only
+        cluster_routes.append([[node] for node in dummy])
+    routes = stitch_routes(clusters, cluster_routes, 6, 13)
+    assert routes == [[node] for node in whole]
+
+
+def test_stitch_leaves_out_unsolved_clusters():
+    data = synthetic_data_model(13, 3, seed=0, as_lists=False)
+    clusters = two_clusters(data)
+    routes = stitch_routes(clusters, [None, [[1, 8], [], [], [9]]], 6, 13)
+    assert routes == [[], [], [1, 11], [], [], [12]]
+
+
+def test_decompose_covers_nodes_and_pairs():
+    data = synthetic_data_model(40, 5, seed=1, as_lists=False)
+    clusters = decompose_instance(data, 3)
+    members = np.sort(np.concatenate([cluster for cluster, _, _ in clusters]))
+    assert np.array_equal(members, np.arange(1, 40))
+    pairs = [len(sub['vehicle_costs']) // 2 for _, _, sub in clusters]
+    firsts = [first for _, first, _ in clusters]
+    assert sum(pairs) == 5
+    assert firsts == np.cumsum([0] + pairs[:-1]).tolist()
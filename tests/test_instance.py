@@ -0,0 +1,40 @@
+"""Round trips of instance files through load_instance."""
+import numpy as np
+
+from disjunctions.instance import load_instance
+from disjunctions.instance import save_instance
+from disjunctions.instance import synthetic_data_model
+
+
+def test_raw_files_with_square_length_demands(tmp_path):
+    # 16 nodes: 256 matrix values and 16 demands, both perfect squares
+    data = synthetic_data_model(16, 1, seed=0, as_lists=False)
+    matrix_path = str(tmp_path / 'matrix.bin')
+    demands_path = str(tmp_path / 'demands.bin')
+    np.asarray(data['distance_matrix'], dtype='<i8').tofile(matrix_path)
+    np.asarray(data['demands'], dtype='<i8').tofile(demands_path)
+    matrix, demands = load_instance(matrix_path, demands_path)
+    assert matrix.shape == (16, 16)
+    assert demands.shape == (16,)
+    assert np.array_equal(matrix, data['distance_matrix'])
+    assert np.array_equal(demands, data['demands'])
+
+
+def test_npy_round_trip(tmp_path):
+    data = synthetic_data_model(16, 1, seed=1)
+    prefix = str(tmp_path / 'instance')
+    save_instance(data, prefix)
+    matrix, demands = load_instance(prefix + '_matrix.npy', prefix + '_demands.npy')
+    assert np.array_equal(matrix, data['distance_matrix'])
+    assert np.array_equal(demands, data['demands'])
+
+
+def test_raw_matrix_not_square(tmp_path):
+    matrix_path = str(tmp_path / 'matrix.bin')
+    np.arange(15, dtype='<i8').tofile(matrix_path)
+    try:
+        load_instance(matrix_path)
+    except ValueError as error:
+        assert 'not square' in str(error)
+    else:
+        raise AssertionError('a 15 value matrix loaded')
@@ -0,0 +1,101 @@
+"""Lookups in CompactMatrix against the dense matrices it replaces."""
+import numpy as np
+
+from disjunctions.instance import augment_distance_matrix
+from disjunctions.instance import synthetic_data_model
+from disjunctions.instance import vehicle_dummy_nodes
+from disjunctions.matrix import CompactMatrix
+from disjunctions.matrix import narrowest_dtype
+
+
+def assert_same_arcs(compact, dense):
+    dense = np.asarray(dense)
+    assert len(compact) == len(dense)
+    for i in range(0, len(dense)):
+        for j in range(0, len(dense)):
+            assert compact[i, j] == dense[i, j], (i, j)
+            assert compact[i][j] == dense[i, j], (i, j)
+            assert compact.arc(i, j) == dense[i, j], (i, j)
+    assert np.array_equal(np.asarray(compact), dense)
+    nodes = np.arange(len(dense))
+    assert np.array_equal(compact.take(nodes[:, None], nodes[None, :]), dense)
+
+
+def small_symmetric_matrix(size, seed=0):
+    # distances below 128 fit int8
+    values = np.random.default_rng(seed).integers(0, 64, size=(size, size))
+    matrix = values + values.T
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def test_narrowest_dtype():
+    assert narrowest_dtype(0, 127) == np.int8
+    assert narrowest_dtype(-128, 0) == np.int8
+    assert narrowest_dtype(0, 128) == np.int16
+    assert narrowest_dtype(-5, 70000) == np.int32
+    assert narrowest_dtype(0, 2**40) == np.int64
+    try:
+        narrowest_dtype(0, 2**63)
+    except OverflowError:
+        pass
+    else:
+        raise AssertionError('2**63 fit a dtype')
+
+
+def test_symmetric_keeps_upper_triangle():
+    matrix = np.asarray(synthetic_data_model(20, 1, seed=0)['distance_matrix'])
+    compact = CompactMatrix.from_matrix(matrix)
+    assert compact.symmetric
+    assert compact.values.size == 20 * 21 // 2
+    # synthetic distances reach about 1414, past int8
+    assert compact.values.dtype == np.int16
+    assert compact.nbytes == 20 * 21 // 2 * 2
+    assert_same_arcs(compact, matrix)
+
+
+def test_nested_lists_and_int8():
+    matrix = small_symmetric_matrix(9)
+    compact = CompactMatrix.from_matrix(matrix.tolist())
+    assert compact.values.dtype == np.int8
+    assert_same_arcs(compact, matrix)
+
+
+def test_asymmetric_keeps_every_entry():
+    matrix = small_symmetric_matrix(9)
+    matrix[2, 5] += 1
+    compact = CompactMatrix.from_matrix(matrix)
+    assert not compact.symmetric
+    assert compact.values.size == 81
+    assert_same_arcs(compact, matrix)
+
+
+def test_dummy_nodes_match_augmented_matrix():
+    data = synthetic_data_model(12, 3, seed=2, as_lists=False)
+    matrix = data['distance_matrix']
+    num_demand_nodes = len(data['demands'])
+    dense = augment_distance_matrix(matrix, num_demand_nodes, 6)
+    compact = augment_distance_matrix(CompactMatrix.from_matrix(matrix),
+                                      num_demand_nodes, 6)
+    assert isinstance(compact, CompactMatrix)
+    assert compact.num_dummy == 6
+    assert compact.nbytes == CompactMatrix.from_matrix(matrix).nbytes
+    assert_same_arcs(compact, dense)
+
+
+def test_dummy_nodes_widen_int8():
+    matrix = small_symmetric_matrix(7)
+    compact = augment_distance_matrix(CompactMatrix.from_matrix(matrix), 5, 2)
+    assert compact.values.dtype == np.int8
+    # the 10000 sentinel does not fit int8
+    assert compact.dtype == np.int16
+    assert_same_arcs(compact, augment_distance_matrix(matrix, 5, 2))
+
+
+def test_vehicle_dummy_nodes_one_at_a_time():
+    dense_data = synthetic_data_model(8, 2, seed=3)
+    compact_data = dict(dense_data, distance_matrix=CompactMatrix.from_matrix(
+        dense_data['distance_matrix']))
+    for _ in range(0, 4):
+        assert vehicle_dummy_nodes(compact_data) == vehicle_dummy_nodes(dense_data)
+    assert_same_arcs(compact_data['distance_matrix'], dense_data['distance_matrix'])